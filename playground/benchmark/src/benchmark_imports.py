@@ -0,0 +1,90 @@
+# Cold import time of the .ozx read, validation and write entry points, each measured in fresh interpreters.
+# Also reports which write-only / model-building dependencies an entry point loads.
+#
+# python -m playground.benchmark.src.benchmark_imports --repeats 5 --output imports.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+
+MODULES = {
+    'zarr': 'zarr',
+    'read': 'playground.zarr_python.src.zip_zarr',
+    'validate': 'playground.validation.zip_zarr_validator.src.ZipZarrValidator',
+    'batch_validate': 'playground.validation.zip_zarr_validator.src.batch_validate',
+    'write': 'playground.zarr_python.src.zip_zarr_writer',
+}
+# dependencies only needed to write (or to build OME-Zarr models)
+WRITE_MODULES = ['ome_zarr', 'ome_zarr_models', 'pydantic', 'pydantic_zarr',
+                 'playground.zarr_python.src.zip_zarr_writer', 'playground.zarr_python.src.zip_shard_writer',
+                 'playground.zarr_python.src.zip_pyramid', 'playground.zarr_python.src.zip_writer']
+# read-only entry points, which should not load any of WRITE_MODULES
+READ_ENTRY_POINTS = ['read', 'validate', 'batch_validate']
+
+IMPORT_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def measure_import(module):
+    """Imports module in a fresh interpreter; returns the import time and the names of all loaded modules."""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    output = subprocess.run([sys.executable, '-c', IMPORT_CODE.format(module=module)], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def get_write_modules(modules):
+    return [module for module in WRITE_MODULES if module in modules]
+
+
+def run_benchmarks(names=None, repeats=5):
+    results = []
+    for name in names or MODULES:
+        measurements = [measure_import(MODULES[name]) for _ in range(repeats)]
+        times = [measurement['seconds'] for measurement in measurements]
+        results.append({
+            'name': name,
+            'module': MODULES[name],
+            'import_ms_median': float(np.median(times)) * 1e3,
+            'import_ms_min': min(times) * 1e3,
+            'nmodules': len(measurements[-1]['modules']),
+            'write_modules': get_write_modules(measurements[-1]['modules']),
+        })
+        print(format_result(results[-1]), flush=True)
+    return results
+
+
+def format_result(result):
+    write_modules = ', '.join(result['write_modules']) or '-'
+    return (f"{result['name']:15} {result['import_ms_median']:8.1f} ms (min {result['import_ms_min']:8.1f})  "
+            f"{result['nmodules']:5} modules  write-only: {write_modules}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark cold import time of the .ozx entry points')
+    parser.add_argument('--names', nargs='+', default=list(MODULES), choices=list(MODULES))
+    parser.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters per entry point')
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.repeats)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'python': sys.version, 'results': results}, file, indent=2)
+    # read-only entry points loading write-only dependencies is a regression
+    return int(any(result['write_modules'] for result in results if result['name'] in READ_ENTRY_POINTS))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
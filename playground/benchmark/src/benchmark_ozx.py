@@ -0,0 +1,243 @@
+# Offline benchmark of .ozx write/read paths vs plain zarr directories, on synthetic data on local disk.
+# Each case runs in a fresh process, so peak RSS is per case.
+#
+# python -m playground.benchmark.src.benchmark_ozx --sizes small medium --output results.json
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import zarr
+
+from playground.ome_zarr_py.src.zip_ome_zarr import zip_ome_zarr_write
+from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZarrValidator
+from playground.zarr_python.src.zip_chunking import get_chunk_shape, get_level_chunks, get_shard_shape
+from playground.zarr_python.src.zip_index import clear_zip_index_cache
+from playground.zarr_python.src.zip_pyramid import PyramidBuilder, get_pyramid_shapes, iter_shard_regions
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import create_image_attributes, zip_zarr_write_streaming
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+SIZES = {'small': 512, 'medium': 2048, 'large': 8192}
+DTYPES = ['uint8', 'uint16', 'float32']
+DIM_ORDERS = {'yx': (), 'cyx': (3,), 'tczyx': (2, 2, 4)}
+FORMATS = ['zip', 'directory', 'ome_zarr_zip']
+SEED = 0
+
+
+def create_data(size, dtype, dim_order, seed=SEED):
+    # Smooth gradients plus noise: compresses like real images rather than pure noise
+    rng = np.random.default_rng(seed)
+    shape = DIM_ORDERS[dim_order] + (size, size)
+    y, x = np.ogrid[:size, :size]
+    plane = (np.sin(y / 37) + np.cos(x / 53) + 2) / 4
+    data = plane + rng.normal(0, 0.05, shape)
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        data = np.clip(data, 0, 1) * np.iinfo(dtype).max
+    return data.astype(dtype)
+
+
+def get_peak_rss_mb():
+    if resource is not None:
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory_info = psutil.Process().memory_info()
+    # peak_wset: peak working set on Windows
+    return getattr(memory_info, 'peak_wset', memory_info.rss) / 1e6
+
+
+def write_directory(path, data, dim_order, nlevels):
+    # Same pyramid/chunking as the zip writer, written to a LocalStore
+    chunks = get_chunk_shape(data.shape, data.dtype, dim_order)
+    shards = get_shard_shape(data.shape, data.dtype, dim_order, chunks)
+    level_shapes = get_pyramid_shapes(data.shape, dim_order, nlevels)
+    placeholders = [np.broadcast_to(np.zeros((), dtype=data.dtype), level_shape) for level_shape in level_shapes]
+    root = zarr.create_group(path, attributes=create_image_attributes(placeholders, dim_order, {}, 2))
+    zarr_datas = [root.create_array(name=str(level), shape=level_shape, dtype=data.dtype,
+                                    dimension_names=list(dim_order), chunks=chunks1, shards=shards1)
+                  for level, (level_shape, (chunks1, shards1))
+                  in enumerate(zip(level_shapes, get_level_chunks(level_shapes, chunks, shards)))]
+    builder = PyramidBuilder(zarr_datas, dim_order)
+    for region in iter_shard_regions(level_shapes, shards, dim_order):
+        builder.write_tile(0, tuple(slice1.start for slice1 in region), data[region])
+
+
+def write(format, path, data, dim_order, nlevels):
+    if format == 'zip':
+        zip_zarr_write_streaming(path, data, dim_order, {}, nlevels=nlevels)
+    elif format == 'directory':
+        write_directory(path, data, dim_order, nlevels)
+    else:
+        zip_ome_zarr_write(path, data)
+
+
+def open_level0(format, path):
+    # All pyramid levels are opened for every format (as zip_zarr_read does), level 0 is returned
+    if format == 'directory':
+        root = zarr.open_group(path, mode='r')
+        multiscale = root.attrs['ome']['multiscales'][0]
+        arrays = [root[dataset['path']] for dataset in multiscale['datasets']]
+        return arrays[0]
+    _, arrays = zip_zarr_read(path)
+    # ome-zarr-py names levels s0, s1, ...
+    return next(array for array in arrays if array.path in ('0', 's0'))
+
+
+def clear_caches():
+    clear_zip_index_cache()
+
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(dirpath, filename))
+               for dirpath, _, filenames in os.walk(path) for filename in filenames)
+
+
+def run_case(case, work_dir, repeats=5, ntiles=50, tile_size=256, nlevels=4):
+    """
+    Runs one benchmark case (format, size, dtype, dim_order) and returns its metrics.
+    """
+    format, size, dtype, dim_order = case['format'], case['size'], case['dtype'], case['dim_order']
+    data = create_data(SIZES[size], dtype, dim_order)
+    path = os.path.join(work_dir, f'{format}_{size}_{dtype}_{dim_order}' + ('.zarr' if format == 'directory'
+                                                                                 else '.ozx'))
+    result = dict(case, nbytes=data.nbytes)
+
+    # warm up (zarr event loop, codecs) so the first timed write does not include one-off setup
+    warmup_path = os.path.join(work_dir, 'warmup' + os.path.splitext(path)[1])
+    write(format, warmup_path, create_data(64, dtype, dim_order), dim_order, 1)
+    remove(warmup_path)
+
+    start = time.perf_counter()
+    write(format, path, data, dim_order, nlevels)
+    write_time = time.perf_counter() - start
+    result['write_mb_s'] = data.nbytes / write_time / 1e6
+    result['stored_mb'] = get_size(path) / 1e6
+
+    open_times = []
+    for _ in range(repeats):
+        clear_caches()
+        start = time.perf_counter()
+        array = open_level0(format, path)
+        open_times.append(time.perf_counter() - start)
+    result['open_ms'] = float(np.median(open_times)) * 1e3
+
+    # random tiles at fixed (seeded) positions, each tile spanning all non-spatial dimensions
+    rng = np.random.default_rng(SEED)
+    tile_size = min(tile_size, SIZES[size])
+    tile_times = []
+    for _ in range(ntiles):
+        y, x = rng.integers(0, SIZES[size] - tile_size + 1, 2)
+        start = time.perf_counter()
+        tile = array[..., y:y + tile_size, x:x + tile_size]
+        tile_times.append(time.perf_counter() - start)
+    assert np.array_equal(tile, data[..., y:y + tile_size, x:x + tile_size])
+    result['tile_ms_median'] = float(np.median(tile_times)) * 1e3
+    result['tile_ms_p95'] = float(np.percentile(tile_times, 95)) * 1e3
+
+    start = time.perf_counter()
+    shard_shape = array.shards or array.chunks
+    for region in itertools.product(*[[slice(start1, start1 + shard) for start1 in range(0, extent, shard)]
+                                      for extent, shard in zip(array.shape, shard_shape)]):
+        array[region]
+    result['scan_mb_s'] = data.nbytes / (time.perf_counter() - start) / 1e6
+
+    if format != 'directory':
+        clear_caches()
+        start = time.perf_counter()
+        validator = ZipZarrValidator(path, fast=True)
+        for name in vars(ZipZarrValidator):
+            if name.startswith('test_'):
+                try:
+                    getattr(validator, name)()
+                except AssertionError:
+                    pass
+        result['validate_ms'] = (time.perf_counter() - start) * 1e3
+
+    result['peak_rss_mb'] = get_peak_rss_mb()
+    remove(path)
+    return result
+
+
+def get_cases(formats, sizes, dtypes, dim_orders):
+    return [{'format': format, 'size': size, 'dtype': dtype, 'dim_order': dim_order}
+            for size, dtype, dim_order, format in itertools.product(sizes, dtypes, dim_orders, formats)
+            # ome-zarr-py chooses its own chunking and pyramid; only compared on 2D images
+            if format != 'ome_zarr_zip' or dim_order == 'yx']
+
+
+def run_benchmarks(cases, work_dir=None, repeats=5, ntiles=50):
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        for case in cases:
+            # fresh process per case: independent peak RSS, no warm caches from earlier cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                try:
+                    result = executor.submit(run_case, case, temp_dir, repeats, ntiles).result()
+                except Exception as error:
+                    result = dict(case, error=f'{type(error).__name__}: {error}')
+            results.append(result)
+            print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result):
+    name = f"{result['format']:13} {result['size']:7} {result['dtype']:8} {result['dim_order']:6}"
+    if 'error' in result:
+        return f"{name} error: {result['error']}"
+    return (f"{name} write {result['write_mb_s']:8.1f} MB/s  open {result['open_ms']:7.2f} ms  "
+            f"tile {result['tile_ms_median']:7.2f} ms (p95 {result['tile_ms_p95']:7.2f})  "
+            f"scan {result['scan_mb_s']:8.1f} MB/s  rss " +
+            (f"{result['peak_rss_mb']:7.1f} MB" if result['peak_rss_mb'] is not None else '      -'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark .ozx read/write paths against zarr directories')
+    parser.add_argument('--formats', nargs='+', default=FORMATS, choices=FORMATS)
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES))
+    parser.add_argument('--dtypes', nargs='+', default=DTYPES)
+    parser.add_argument('--dim-orders', nargs='+', default=list(DIM_ORDERS), choices=list(DIM_ORDERS))
+    parser.add_argument('--repeats', type=int, default=5, help='repeats of the open latency measurement')
+    parser.add_argument('--tiles', type=int, default=50, help='number of random tile reads')
+    parser.add_argument('--work-dir', help='directory for temporary files (default: system temp)')
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    cases = get_cases(args.formats, args.sizes, args.dtypes, args.dim_orders)
+    results = run_benchmarks(cases, args.work_dir, args.repeats, args.tiles)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'platform': platform.platform(), 'python': platform.python_version(),
+                       'cpus': os.cpu_count(), 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+from playground.benchmark.src.benchmark_imports import MODULES, get_write_modules, measure_import
+
+
+def test_read_imports():
+    # the read and validation entry points do not load any write-only / model-building dependencies
+    for name in ['read', 'validate']:
+        result = measure_import(MODULES[name])
+        assert result['seconds'] > 0
+        assert MODULES[name] in result['modules']
+        assert get_write_modules(result['modules']) == []
+        assert 'http.client' not in result['modules']
+
+
+def test_write_imports():
+    result = measure_import(MODULES['write'])
+    assert 'playground.zarr_python.src.zip_writer' in get_write_modules(result['modules'])
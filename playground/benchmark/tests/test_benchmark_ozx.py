@@ -0,0 +1,19 @@
+import numpy as np
+
+from playground.benchmark.src.benchmark_ozx import create_data, get_cases, run_case
+
+
+def test_create_data_reproducible():
+    data = create_data(64, 'uint16', 'cyx')
+    assert data.shape == (3, 64, 64) and data.dtype == np.uint16
+    assert np.array_equal(data, create_data(64, 'uint16', 'cyx'))
+
+
+def test_run_case(tmp_path):
+    cases = get_cases(['zip', 'directory', 'ome_zarr_zip'], ['small'], ['uint8'], ['yx', 'cyx'])
+    assert len(cases) == 5
+    for case in cases[:2]:
+        result = run_case(case, str(tmp_path), repeats=1, ntiles=3)
+        for key in ['write_mb_s', 'open_ms', 'tile_ms_median', 'scan_mb_s', 'peak_rss_mb']:
+            assert result[key] > 0
+        assert ('validate_ms' in result) == (case['format'] != 'directory')
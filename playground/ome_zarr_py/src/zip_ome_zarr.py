@@ -1,10 +1,14 @@
+import os
+import tempfile
+
 import numpy as np
 from ome_zarr import writer
 from ome_zarr.io import parse_url
 from ome_zarr.reader import Reader
 
 import zarr
-from zarr.storage import ZipStore
+
+from playground.zarr_python.src.zip_pack import pack_zarr
 
 
 def _get_ome_zarr_reader(uri):
@@ -29,9 +33,13 @@ def zip_ome_zarr_read(filename, level=0):
 
 
 def zip_ome_zarr_write(uri, data):
-    store = ZipStore(uri, mode='w')
-    root = zarr.create_group(store) # creates basic root zarr.json
-    writer.write_image(image=data, group=root) # updates root zarr.json various times, writes pyramid metadata & data interlaced
+    # write_image updates the root zarr.json various times and interlaces pyramid metadata & data, so writing it to a
+    # ZipStore directly leaves duplicate entries in the wrong order. Write a temporary zarr directory instead, and
+    # pack it in one pass (zarr.json entries first, data copied without re-encoding)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(uri))) as temp_dir:
+        zarr_uri = os.path.join(temp_dir, 'image.zarr')
+        ome_zarr_write_zarr(zarr_uri, data)
+        pack_zarr(zarr_uri, uri)
 
 
 def ome_zarr_write_zarr(uri, data):
@@ -1,26 +1,38 @@
 # https://ngff.openmicroscopy.org/rfc/9/index.html#specification
 
+import functools
 import json
 import os.path
 import re
 import tempfile
 import zipfile
 
-import ome_zarr_models
 import zarr
-from ome_zarr_models.base import BaseAttrs
-from zarr.storage import ZipStore
+from zarr.core.buffer import default_buffer_prototype
+from zarr.storage import MemoryStore
 
-from playground.zarr_python.src.zip_zarr import zip_zarr_write, get_zarr_data
-#from playground.validation.zip_zarr_validator.src.util import check_for_zip64_signature
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_index import get_zip_index, read_metadata_documents
+from playground.zarr_python.src.zip_instrumentation import InstrumentedStore
+from playground.zarr_python.src.zip_integrity import verify_zip
+from playground.zarr_python.src.zip_zarr import get_zarr_data
 
 
 class ZipZarrValidator:
     metadata_filename = 'zarr.json'
 
-    def __init__(self, uri, data=None, dim_order=None, pixel_size=None):
+    def __init__(self, uri, data=None, dim_order=None, pixel_size=None, sidecar=False, fast=False, integrity=False,
+                 check_shard_indexes=False, max_workers=None, stats=None):
+        # fast: structural checks only use the central directory and zarr.json entries (read in one pass);
+        # the zarr hierarchy is opened lazily, only by checks that need it
+        # integrity: test_integrity verifies the CRC-32 of all entries (reading the whole archive), and with
+        # check_shard_indexes also decodes and checks every shard index; max_workers: number of threads
+        # stats: optional StoreStats recording the reads through the zarr store
         self.temp_dir = None
         if data is not None:
+            # the writer (and its OME-Zarr model dependencies) is only imported to create test data
+            from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write
+
             if not os.path.dirname(uri):
                 # Add temp dir
                 self.temp_dir = tempfile.TemporaryDirectory()
@@ -31,12 +43,74 @@ class ZipZarrValidator:
 
         self.uri = uri
         assert zipfile.is_zipfile(self.uri), f'file not recognised as zip file'
-        self.zip = zipfile.ZipFile(self.uri)
-        self.zip_filenames = self.zip.namelist()
-        self.store = ZipStore(self.uri)
-        self.root = zarr.open(self.store, mode='r')
-        self.metadata = self.root.metadata.to_dict()
-        self.data = get_zarr_data(self.root)
+        # central directory is parsed once, and shared with the zarr store
+        self.index = get_zip_index(self.uri, sidecar=sidecar)
+        self.zip_filenames = self.index.names
+        self.fast = fast
+        self.integrity = integrity
+        self.check_shard_indexes = check_shard_indexes
+        self.max_workers = max_workers
+        self.stats = stats
+        if not fast:
+            self._open_data()
+
+    @functools.cached_property
+    def store(self):
+        store = OzxStore(self.uri, index=self.index)
+        if self.stats is not None:
+            return InstrumentedStore(store, self.stats)
+        return store
+
+    @functools.cached_property
+    def root(self):
+        return zarr.open(self.store, mode='r')
+
+    @functools.cached_property
+    def metadata(self):
+        if self.fast:
+            return self.metadata_documents.get('')
+        return self.root.metadata.to_dict()
+
+    @functools.cached_property
+    def data(self):
+        return get_zarr_data(self.root)
+
+    def _open_data(self):
+        # opens the hierarchy and its arrays up front (full mode)
+        return self.data
+
+    @functools.cached_property
+    def metadata_documents(self):
+        # node path -> zarr.json contents
+        return read_metadata_documents(self.uri, self.index, self.metadata_filename)
+
+    @functools.cached_property
+    def integrity_report(self):
+        # entries/bytes checked, seconds, throughput (mb_s) and the corrupted entries
+        documents = self.metadata_documents if self.check_shard_indexes else None
+        return verify_zip(self.uri, self.index, documents=documents, check_shard_indexes=self.check_shard_indexes,
+                          max_workers=self.max_workers)
+
+    def get_metadata_root(self):
+        # The hierarchy from the zarr.json documents (read in one pass) in an in-memory store, for checks that
+        # validate the metadata of every node without reading entries per node
+        prototype = default_buffer_prototype()
+        store_dict = {}
+        for path, document in self.metadata_documents.items():
+            key = f'{path}/{self.metadata_filename}' if path else self.metadata_filename
+            store_dict[key] = prototype.buffer.from_bytes(json.dumps(document).encode('utf-8'))
+        return zarr.open_group(MemoryStore(store_dict=store_dict, read_only=True), mode='r')
+
+    def get_root_keys(self):
+        if self.fast:
+            return set(path.split('/')[0] for path in self.metadata_documents if path)
+        return set(self.root.keys())
+
+    def get_first_array_metadata(self):
+        for document in self.metadata_documents.values():
+            if document.get('node_type') == 'array':
+                return document
+        return None
 
     def zip_list_root(self):
         root_paths = set()
@@ -49,10 +123,15 @@ class ZipZarrValidator:
     def test_requirement12(self):
         # The ZIP file MUST contain exactly one OME-Zarr hierarchy.
         # The root of the ZIP archive MUST correspond to the root of the OME-Zarr hierarchy. The ZIP file MUST contain the OME-Zarr’s root-level zarr.json.
+        # ome_zarr_models (pydantic model building) is slow to import: only imported by this check
+        import ome_zarr_models
+        from ome_zarr_models.base import BaseAttrs
+
         assert isinstance(self.metadata, dict), f'metadata is not a dict: {self.metadata}'
-        model = ome_zarr_models.open_ome_zarr(self.root) # this function validates the zarr
+        root = self.get_metadata_root() if self.fast else self.root
+        model = ome_zarr_models.open_ome_zarr(root) # this function validates the zarr
         assert isinstance(model.ome_attributes, BaseAttrs), f'Invalid zarr'
-        root_zarr_filenames = set([self.metadata_filename] + list(self.root.keys()))
+        root_zarr_filenames = set([self.metadata_filename]) | self.get_root_keys()
         root_zip_filenames = self.zip_list_root()
         assert root_zarr_filenames == root_zip_filenames, f'Root hierarchy invalid'
 
@@ -67,18 +146,24 @@ class ZipZarrValidator:
 
     def test_recommendation1(self):
         # The ZIP64 format extension SHOULD be used, irrespective of the ZIP file size.
-        #assert check_for_zip64_signature(self.uri) == True, 'ZIP64 format extension should be used'
-        assert True # TODO: check if this can be detected; recommendation under review
+        # (the index is parsed from the end of central directory records, which are ZIP64 if the extension is used)
+        assert self.index.zip64, 'ZIP64 format extension should be used'
 
     def test_recommendation2(self):
         # ZIP-level compression SHOULD be disabled in favor of Zarr-level compression codecs.
-        zip = self.zip
-        assert zip.compression == zipfile.ZIP_STORED, f'Compression should be disabled, using "STORE" instead of {zip.compression}'
-        assert zip.compresslevel is None, f'Compresslevel should be None instead of {zip.compresslevel}'
+        for filename, compression in zip(self.zip_filenames, self.index.compress_types):
+            assert compression == zipfile.ZIP_STORED, \
+                f'Compression should be disabled, using "STORE" instead of {compression} for {filename}'
 
     def test_recommendation3(self):
         # The sharding codec SHOULD be used to reduce the number of entries within the ZIP archive.
-        assert self.data[0].shards, f'No sharding'
+        if self.fast:
+            array_metadata = self.get_first_array_metadata()
+            assert array_metadata is not None, f'No arrays'
+            codec_names = [codec.get('name') for codec in array_metadata.get('codecs', [])]
+            assert 'sharding_indexed' in codec_names, f'No sharding'
+        else:
+            assert self.data[0].shards, f'No sharding'
 
     def test_recommendation4(self):
         # The root-level zarr.json file SHOULD be the first ZIP file entry and the first entry in the central directory header; other zarr.json files SHOULD follow immediately afterwards, in breadth-first order.
@@ -93,7 +178,7 @@ class ZipZarrValidator:
 
     def test_recommendation5(self):
         # The ZIP archive comment SHOULD contain null-terminated UTF-8-encoded JSON with an ome attribute that holds a version key with the OME-Zarr version as string value, equivalent to {"ome": { "version": "XX.YY" }}.
-        comment = self.zip.comment.decode('utf-8')
+        comment = self.index.comment.decode('utf-8')
         if comment:
             comment_dict = json.loads(comment.replace("'", '"'))
         else:
@@ -107,6 +192,14 @@ class ZipZarrValidator:
         # The name of OME-Zarr zip files SHOULD end with .ozx.
         assert self.uri.endswith('.ozx'), f'{self.uri} should end with .ozx'
 
+    def test_integrity(self):
+        # Not part of RFC-9: stored entries match their CRC-32 (and shard indexes are consistent); integrity mode only
+        if not self.integrity:
+            return
+        corrupted = self.integrity_report['corrupted']
+        assert not corrupted, 'Corrupted entries: ' + ', '.join(f"{entry['name']} ({entry['error']})"
+                                                                  for entry in corrupted)
+
     def cleanup(self):
         if self.temp_dir is not None:
             self.temp_dir.cleanup()
@@ -0,0 +1,164 @@
+# Validates all zip zarr files in directory trees in parallel, streaming results as JSON lines
+
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZarrValidator
+
+
+def get_check_names(integrity=False):
+    return [name for name in vars(ZipZarrValidator)
+            if name.startswith('test_') and (integrity or name != 'test_integrity')]
+
+
+def find_files(paths, pattern='*.ozx'):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if fnmatch.fnmatch(filename, pattern):
+                    yield os.path.join(dirpath, filename)
+
+
+def validate_file(uri, fast=True, check_names=None, integrity=False, check_shard_indexes=False, integrity_workers=None):
+    # integrity_workers: number of threads verifying the archive in integrity mode (default: CPU count)
+    if check_names is None:
+        check_names = get_check_names(integrity)
+    result = {'uri': uri, 'valid': False, 'checks': {}}
+    start = time.perf_counter()
+    try:
+        validator = ZipZarrValidator(uri, fast=fast, integrity=integrity, check_shard_indexes=check_shard_indexes,
+                                     max_workers=integrity_workers)
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+        result['time'] = time.perf_counter() - start
+        return result
+    result['open_time'] = time.perf_counter() - start
+
+    for check_name in check_names:
+        check_start = time.perf_counter()
+        try:
+            getattr(validator, check_name)()
+            check = {'status': 'passed'}
+        except AssertionError as error:
+            check = {'status': 'failed', 'message': str(error)}
+        except Exception as error:
+            check = {'status': 'error', 'message': f'{type(error).__name__}: {error}'}
+        check['time'] = time.perf_counter() - check_start
+        result['checks'][check_name] = check
+    if integrity and 'integrity_report' in vars(validator):
+        result['integrity'] = validator.integrity_report
+    result['valid'] = all(check['status'] == 'passed' for check in result['checks'].values())
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def create_summary(results, check_names, elapsed):
+    summary = {
+        'files': len(results),
+        'valid': sum(1 for result in results if result['valid']),
+        'invalid': sum(1 for result in results if not result['valid'] and 'error' not in result),
+        'errors': sum(1 for result in results if 'error' in result),
+        'elapsed': elapsed,
+        'checks': {},
+    }
+    for check_name in check_names:
+        checks = [result['checks'][check_name] for result in results if check_name in result['checks']]
+        times = [check['time'] for check in checks]
+        summary['checks'][check_name] = {
+            'passed': sum(1 for check in checks if check['status'] == 'passed'),
+            'failed': sum(1 for check in checks if check['status'] == 'failed'),
+            'error': sum(1 for check in checks if check['status'] == 'error'),
+            'total_time': sum(times),
+            'mean_time': sum(times) / len(times) if times else 0,
+            'max_time': max(times, default=0),
+        }
+    reports = [result['integrity'] for result in results if 'integrity' in result]
+    if reports:
+        nbytes = sum(report['bytes'] for report in reports)
+        seconds = sum(report['seconds'] for report in reports)
+        summary['integrity'] = {
+            'bytes': nbytes,
+            'seconds': seconds,
+            'mb_s': nbytes / seconds / 1e6 if seconds > 0 else 0,
+            'corrupted_files': sum(1 for report in reports if report['corrupted']),
+            'corrupted_entries': sum(len(report['corrupted']) for report in reports),
+        }
+    return summary
+
+
+def validate_files(uris, fast=True, max_workers=None, output=sys.stdout, integrity=False, check_shard_indexes=False,
+                   integrity_workers=None):
+    """
+    Validates files in a process pool, writing one JSON line per file to output as soon as it completes.
+    integrity_workers: threads per worker process for integrity checks; by default the CPUs are divided over the
+    worker processes. Returns the aggregate summary.
+    """
+    check_names = get_check_names(integrity)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if integrity_workers is None:
+        integrity_workers = max((os.cpu_count() or 1) // max_workers, 1)
+    results = []
+    start = time.perf_counter()
+    # spawn: workers should not inherit threads (e.g. zarr's event loop) from this process
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(validate_file, uri, fast, check_names, integrity, check_shard_indexes,
+                                   integrity_workers): uri
+                   for uri in uris}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                # e.g. a worker process killed while validating (BrokenProcessPool): recorded, the batch continues
+                result = {'uri': futures[future], 'valid': False, 'checks': {},
+                          'error': f'{type(error).__name__}: {error}'}
+            results.append(result)
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    return create_summary(results, check_names, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate zipped OME-Zarr files (RFC-9)')
+    parser.add_argument('paths', nargs='+', help='files or directories to validate (searched recursively)')
+    parser.add_argument('--pattern', default='*.ozx', help='filename pattern for directories (default: *.ozx)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: CPU count)')
+    parser.add_argument('--full', action='store_true', help='open the full zarr hierarchy instead of fast mode')
+    parser.add_argument('--integrity', action='store_true', help='verify the CRC-32 of all entries (reads all data)')
+    parser.add_argument('--shard-indexes', action='store_true', help='with --integrity: also check all shard indexes')
+    parser.add_argument('--integrity-threads', type=int, default=None,
+                        help='with --integrity: threads per worker process (default: CPU count / workers)')
+    parser.add_argument('--output', help='JSON lines output file (default: stdout)')
+    parser.add_argument('--summary', help='summary JSON output file (default: stderr)')
+    args = parser.parse_args(argv)
+
+    uris = list(find_files(args.paths, args.pattern))
+    options = {'fast': not args.full, 'max_workers': args.workers, 'integrity': args.integrity,
+               'check_shard_indexes': args.shard_indexes, 'integrity_workers': args.integrity_threads}
+    if args.output:
+        with open(args.output, 'w') as output:
+            summary = validate_files(uris, output=output, **options)
+    else:
+        summary = validate_files(uris, **options)
+
+    if args.summary:
+        with open(args.summary, 'w') as file:
+            json.dump(summary, file, indent=2)
+    else:
+        json.dump(summary, sys.stderr, indent=2)
+        sys.stderr.write('\n')
+    return 0 if summary['valid'] == summary['files'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
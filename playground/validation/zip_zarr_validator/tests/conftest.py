@@ -3,7 +3,12 @@ import pytest
 
 def pytest_addoption(parser):
     parser.addoption("--uri", action="store")
+    parser.addoption("--fast", action="store_true")
 
 @pytest.fixture(scope='class')
 def uri(request):
     return request.config.option.uri
+
+@pytest.fixture(scope='class')
+def fast(request):
+    return request.config.option.fast
@@ -0,0 +1,33 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from playground.validation.zip_zarr_validator.src.batch_validate import main
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write
+
+
+def test_batch_validate(tmp_path):
+    os.makedirs(os.path.join(tmp_path, 'sub'))
+    valid_uri = os.path.join(tmp_path, 'valid.ozx')
+    zip_zarr_write(valid_uri, np.random.rand(50, 50), 'yx', {'x': 1, 'y': 1})
+    shutil.copy(valid_uri, os.path.join(tmp_path, 'sub', 'copy.ozx'))
+    with open(os.path.join(tmp_path, 'sub', 'broken.ozx'), 'wb') as file:
+        file.write(b'not a zip file')
+
+    output = os.path.join(tmp_path, 'results.jsonl')
+    summary_filename = os.path.join(tmp_path, 'summary.json')
+    exit_code = main([str(tmp_path), '--workers', '2', '--output', output, '--summary', summary_filename])
+    assert exit_code == 1
+
+    with open(output) as file:
+        results = {os.path.basename(result['uri']): result for result in map(json.loads, file)}
+    assert sorted(results) == ['broken.ozx', 'copy.ozx', 'valid.ozx']
+    assert results['valid.ozx']['valid'] and results['copy.ozx']['valid']
+    assert not results['broken.ozx']['valid'] and 'error' in results['broken.ozx']
+
+    with open(summary_filename) as file:
+        summary = json.load(file)
+    assert summary['files'] == 3 and summary['valid'] == 2 and summary['errors'] == 1
+    assert summary['checks']['test_recommendation4']['passed'] == 2
@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZarrValidator
+from playground.validation.zip_zarr_validator.src.batch_validate import validate_file
+from playground.zarr_python.src.zip_index import ZipIndex
+from playground.zarr_python.src.zip_integrity import EMPTY_CHUNK, check_shard_index, verify_zip
+from playground.zarr_python.src.zip_writer import StoredZipWriter
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def corrupt_entry(uri, name, position=0):
+    index = ZipIndex.from_file(uri)
+    with open(uri, 'r+b') as file:
+        def read(offset, size):
+            file.seek(offset)
+            return file.read(size)
+
+        offset = index.get_data_offset(index.lookup[name], read) + position
+        value = read(offset, 1)[0]
+        file.seek(offset)
+        file.write(bytes([value ^ 0xFF]))
+
+
+@pytest.fixture
+def uri(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(2, 200, 150)
+    zip_zarr_write_streaming(uri, data, 'cyx', {'x': 1, 'y': 1}, chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=3)
+    return uri
+
+
+def test_integrity(uri, tmp_path):
+    validator = ZipZarrValidator(uri, fast=True, integrity=True, check_shard_indexes=True, max_workers=2)
+    validator.test_integrity()
+    report = validator.integrity_report
+    assert report['entries'] == len(validator.index) and not report['corrupted']
+    assert report['bytes_read'] >= report['bytes'] > 0
+
+    corrupted_uri = os.path.join(tmp_path, 'corrupted.ozx')
+    shutil.copy(uri, corrupted_uri)
+    corrupt_entry(corrupted_uri, '0/c/1/1/1', 100)
+    corrupt_entry(corrupted_uri, '1/zarr.json')
+    # small spans: entries verified across several workers
+    report = verify_zip(corrupted_uri, max_workers=4, block_size=4096)
+    assert [entry['name'] for entry in report['corrupted']] == ['0/c/1/1/1', '1/zarr.json']
+    assert 'CRC-32' in report['corrupted'][0]['error']
+
+    validator = ZipZarrValidator(corrupted_uri, fast=True, integrity=True)
+    with pytest.raises(AssertionError, match='0/c/1/1/1'):
+        validator.test_integrity()
+    result = validate_file(corrupted_uri, integrity=True)
+    assert not result['valid'] and result['checks']['test_integrity']['status'] == 'failed'
+    assert len(result['integrity']['corrupted']) == 2
+    # structural validation alone does not read the data
+    assert 'test_integrity' not in validate_file(corrupted_uri)['checks']
+
+
+def test_shard_index_integrity(uri, tmp_path):
+    # a shard with a valid CRC-32 but an invalid index (e.g. corrupted before it was zipped)
+    index = ZipIndex.from_file(uri)
+    source = ZipZarrValidator(uri, fast=True)
+    documents = source.metadata_documents
+    shard_uri = os.path.join(tmp_path, 'shard.ozx')
+    with StoredZipWriter(shard_uri) as writer:
+        for name in index.names:
+            data = source.store.get_entry_view(name).tobytes()
+            if name == '0/c/0/0/0':
+                data = data[:-20] + bytes(20)
+            writer.write(name, data)
+        writer.close(index.comment)
+    assert not verify_zip(shard_uri)['corrupted']
+    report = verify_zip(shard_uri, documents=documents, check_shard_indexes=True)
+    assert [(entry['name'], entry['error']) for entry in report['corrupted']] == \
+        [('0/c/0/0/0', 'shard index checksum mismatch')]
+
+
+def test_shard_index_bounds():
+    # (offset, nbytes) entries of a 2 chunk shard index at the end of a 100 byte shard, without checksum
+    layout = (2, 'end', False)
+
+    def check(entries):
+        index_bytes = np.array(entries, dtype='<u8').tobytes()
+        return check_shard_index(100, lambda offset, size: index_bytes[offset - 68:offset - 68 + size], layout)
+
+    empty = [EMPTY_CHUNK, EMPTY_CHUNK]
+    assert check([[0, 30], [30, 38]]) is None
+    assert check([[0, 30], empty]) is None
+    assert check([[0, 30], [30, 39]]) is not None
+    # offset + nbytes wraps around in uint64
+    assert check([[0, 30], [2 ** 64 - 1, 10]]) is not None
+    assert check([[0, 30], [10, 2 ** 64 - 5]]) is not None
@@ -6,11 +6,14 @@ from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZar
 
 ids = [
     'generated',
+    'generated_fast',
 #    '6001240'
 ]
 
 params = [
     {'uri': 'test.ozx', 'data': np.random.rand(100, 100), 'dim_order': 'yx', 'pixel_size': {'x': 1, 'y': 1}},
+    {'uri': 'test.ozx', 'data': np.random.rand(100, 100), 'dim_order': 'yx', 'pixel_size': {'x': 1, 'y': 1},
+     'fast': True},
 #    {'uri': 'D:/slides/ozx/6001240.ozx'}
 ]
 
@@ -21,9 +24,9 @@ class TestZipZarr:
 
     @pytest.fixture(autouse=True, scope='class')
     @classmethod
-    def setup_and_teardown(self, value, uri) -> None:
+    def setup_and_teardown(self, value, uri, fast) -> None:
         if uri:
-            params = {'uri': uri}
+            params = {'uri': uri, 'fast': fast}
         else:
             params = value
         self.validator = ZipZarrValidator(**params)
@@ -0,0 +1,256 @@
+import http.client
+import io
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from zarr.abc.store import Store
+
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_index import MAX_TAIL_SIZE, ZipIndex
+
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class HttpRangeReader:
+    """
+    Reads byte ranges of a remote file with HTTP range requests, over persistent (keep-alive) connections, one per
+    thread. Reads are served from an LRU cache of fixed-size blocks; missing adjacent blocks are fetched in a single
+    request.
+    """
+
+    def __init__(self, url, block_size=256 * 1024, cache_size=64 * 1024 * 1024, timeout=30, headers=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f'Unsupported url scheme: {url}')
+        self.url = url
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.target = parts.path + (f'?{parts.query}' if parts.query else '')
+        self.block_size = block_size
+        self.max_blocks = max(cache_size // block_size, 1)
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.size = None
+        self.tail = (0, b'')
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.connections = []
+        self.nrequests = 0
+
+    def _get_connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            if self.scheme == 'https':
+                connection = http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def _request(self, byte_range):
+        # Returns (data, start, total size) of a 'bytes=...' range request
+        headers = dict(self.headers, Range=f'bytes={byte_range}')
+        for attempt in range(2):
+            connection = self._get_connection()
+            try:
+                connection.request('GET', self.target, headers=headers)
+                response = connection.getresponse()
+                if response.status == 206:
+                    data = response.read()
+                    break
+            except (http.client.HTTPException, ConnectionError):
+                # the server may have closed an idle keep-alive connection: reconnect once
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            # don't read a full (non-range) or error body: drop the connection instead
+            connection.close()
+            with self.lock:
+                self.nrequests += 1
+            raise OSError(f'Range request failed for {self.url}: HTTP {response.status} {response.reason}')
+        with self.lock:
+            self.nrequests += 1
+        match = CONTENT_RANGE_PATTERN.fullmatch(response.getheader('Content-Range', ''))
+        if match is None:
+            raise OSError(f'Invalid Content-Range from {self.url}: {response.getheader("Content-Range")}')
+        total = int(match.group(3)) if match.group(3) != '*' else None
+        return data, int(match.group(1)), total
+
+    def fetch_tail(self, size=MAX_TAIL_SIZE):
+        # A suffix request returns the end of the file, and its total size
+        data, start, total = self._request(f'-{size}')
+        self.size = total if total is not None else start + len(data)
+        self.tail = (start, data)
+        return data
+
+    def _fetch_blocks(self, first, last):
+        data, _, _ = self._request(f'{first * self.block_size}-{min((last + 1) * self.block_size, self.size) - 1}')
+        with self.lock:
+            for block in range(first, last + 1):
+                start = (block - first) * self.block_size
+                self.blocks[block] = data[start:start + self.block_size]
+                self.blocks.move_to_end(block)
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        return data
+
+    def read(self, offset, size):
+        if self.size is None:
+            self.fetch_tail()
+        size = max(min(size, self.size - offset), 0)
+        if size == 0:
+            return b''
+        tail_start, tail = self.tail
+        if offset >= tail_start:
+            return tail[offset - tail_start:offset - tail_start + size]
+        first, last = offset // self.block_size, (offset + size - 1) // self.block_size
+        if last - first + 1 > self.max_blocks // 4:
+            # large reads bypass the cache
+            data, _, _ = self._request(f'{offset}-{offset + size - 1}')
+            return data
+        parts = {}
+        missing = []
+        with self.lock:
+            for block in range(first, last + 1):
+                part = self.blocks.get(block)
+                if part is not None:
+                    self.blocks.move_to_end(block)
+                    parts[block] = part
+                else:
+                    missing.append(block)
+        # fetch runs of adjacent missing blocks
+        runs = []
+        for block in missing:
+            if runs and runs[-1][1] == block - 1:
+                runs[-1][1] = block
+            else:
+                runs.append([block, block])
+        for run_first, run_last in runs:
+            data = self._fetch_blocks(run_first, run_last)
+            for block in range(run_first, run_last + 1):
+                start = (block - run_first) * self.block_size
+                parts[block] = data[start:start + self.block_size]
+        data = b''.join(parts[block] for block in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + size]
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+            self.blocks.clear()
+        self.local = threading.local()
+
+
+class RangeFile(io.RawIOBase):
+    """Read-only seekable file object over a HttpRangeReader (for zipfile and the central directory parser)."""
+
+    def __init__(self, reader):
+        super().__init__()
+        self.reader = reader
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            if self.reader.size is None:
+                self.reader.fetch_tail()
+            offset += self.reader.size
+        if offset < 0:
+            raise OSError('Negative seek position')
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        if self.reader.size is None:
+            self.reader.fetch_tail()
+        if size is None or size < 0:
+            size = self.reader.size - self.position
+        data = self.reader.read(self.position, size)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class HttpOzxStore(OzxStore):
+    """
+    Read-only zarr store for .ozx files served over HTTP(S) with range request support. Opening fetches the tail of
+    the file once (end of central directory / ZIP64 records), then the central directory; entries are read with
+    coalesced range requests (see OzxStore.get_ranges_sync), through a block cache and reused connections.
+    """
+
+    def __init__(self, url, index=None, shard_index_cache_size=1024, block_size=256 * 1024,
+                 cache_size=64 * 1024 * 1024, timeout=30, headers=None):
+        super().__init__(url, index=index, shard_index_cache_size=shard_index_cache_size)
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.headers = headers
+
+    def _sync_open(self):
+        if self._is_open:
+            raise ValueError('store is already open')
+        self._lock = threading.Lock()
+        self._reader = HttpRangeReader(self.path, block_size=self.block_size, cache_size=self.cache_size,
+                                       timeout=self.timeout, headers=self.headers)
+        self._reader.fetch_tail()
+        if self.index is None:
+            self.index = ZipIndex.from_fileobj(RangeFile(self._reader), self.path)
+        self._is_open = True
+
+    def close(self):
+        if not self._is_open:
+            return
+        Store.close(self)
+        self._clear_caches()
+        self._reader.close()
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_reader', None)
+        return state
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"HttpOzxStore('{self}')"
+
+    def get_file(self):
+        self._ensure_open_sync()
+        return RangeFile(self._reader)
+
+    def _read(self, offset, size):
+        return memoryview(self._reader.read(offset, size))
+
+    def _read_compressed(self, key):
+        if self._zipfile is None:
+            self._zipfile = zipfile.ZipFile(self.get_file())
+        with self._lock:
+            return memoryview(self._zipfile.read(key))
@@ -0,0 +1,377 @@
+import asyncio
+import functools
+import mmap
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from zarr.abc.store import OffsetByteRequest, RangeByteRequest, Store, SuffixByteRequest
+from zarr.core.buffer import default_buffer_prototype
+
+from playground.zarr_python.src.zip_index import get_zip_index
+
+
+class OzxStore(Store):
+    """
+    Read-only zarr store for zipped OME-Zarr (.ozx) files, using a shared central directory index (ZipIndex)
+    instead of parsing the archive through zipfile.
+
+    The archive is memory-mapped: entries stored without zip compression (ZIP_STORED, as recommended by RFC-9)
+    are returned as zero-copy views into the mapping. Only compressed entries are read and decompressed.
+
+    For sharded arrays, shard index reads (suffix requests, as zarr stores the index at the end of a shard by
+    default) are cached per shard, and the inner chunk ranges zarr requests from a shard are resolved to absolute
+    archive offsets once and coalesced into as few reads as possible.
+    """
+
+    supports_writes = False
+    supports_deletes = False
+    supports_listing = True
+
+    def __init__(self, path, index=None, sidecar=False, shard_index_cache_size=1024):
+        super().__init__(read_only=True)
+        self.path = str(path)
+        self.index = index
+        # an index given by the caller is kept on close; an index loaded on open is reloaded on reopen
+        self._given_index = index
+        self.sidecar = sidecar
+        self.shard_index_cache_size = shard_index_cache_size
+        self._shard_index_cache = OrderedDict()
+        self._zipfile = None
+        self._open_lock = threading.Lock()
+
+    def _ensure_open_sync(self):
+        # Opens the store on first use, once, also when the first reads come from several threads
+        if self._is_open:
+            return
+        with self._open_lock:
+            if not self._is_open:
+                self._sync_open()
+
+    def _sync_open(self):
+        if self._is_open:
+            raise ValueError('store is already open')
+        if self.index is None:
+            self.index = get_zip_index(self.path, sidecar=self.sidecar)
+        self._lock = threading.Lock()
+        with open(self.path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._is_open = True
+
+    async def _open(self):
+        self._ensure_open_sync()
+
+    def _clear_caches(self):
+        # cached shard indexes are views into the mapping (and stale once the file changes)
+        self._shard_index_cache.clear()
+        self.index = self._given_index
+
+    def close(self):
+        if not self._is_open:
+            return
+        super().close()
+        self._clear_caches()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # views returned to callers are still alive; the mapping is released when they are
+            pass
+        self._mmap = None
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in ['_mmap', '_view', '_lock', '_open_lock', '_zipfile', '_shard_index_cache']:
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._shard_index_cache = OrderedDict()
+        self._zipfile = None
+        self._open_lock = threading.Lock()
+        self._is_open = False
+
+    def __eq__(self, other):
+        return isinstance(other, type(self)) and self.path == other.path
+
+    def __hash__(self):
+        return hash((type(self), self.path))
+
+    def __str__(self):
+        return f'ozx://{self.path}'
+
+    def __repr__(self):
+        return f"OzxStore('{self}')"
+
+    def _read(self, offset, size):
+        return self._view[offset:offset + size]
+
+    def get_file(self):
+        """Returns the file (a filename, or a seekable file object) for whole-archive readers such as zipfile."""
+        return self.path
+
+    def get_entry_view(self, key, byte_range=None):
+        """Returns the (partial) content of an entry as memoryview, or None if the entry does not exist."""
+        self._ensure_open_sync()
+        index = self.index.lookup.get(key)
+        if index is None:
+            return None
+        size = int(self.index.sizes[index])
+        start, stop = get_byte_range(byte_range, size)
+        if self.index.compress_types[index] != zipfile.ZIP_STORED:
+            return self._read_compressed(key)[start:stop]
+        data_offset = self.index.get_data_offset(index, self._read)
+        return self._read(data_offset + start, stop - start)
+
+    def _read_compressed(self, key):
+        # Fall back to zipfile for compressed entries
+        if self._zipfile is None:
+            self._zipfile = zipfile.ZipFile(self.path)
+        with self._lock:
+            return memoryview(self._zipfile.read(key))
+
+    def _get_shard_index(self, key, byte_range):
+        cache_key = (key, byte_range.suffix)
+        with self._lock:
+            view = self._shard_index_cache.get(cache_key)
+            if view is not None:
+                self._shard_index_cache.move_to_end(cache_key)
+                return view
+        view = self.get_entry_view(key, byte_range)
+        if view is not None and self.shard_index_cache_size > 0:
+            with self._lock:
+                self._shard_index_cache[cache_key] = view
+                while len(self._shard_index_cache) > self.shard_index_cache_size:
+                    self._shard_index_cache.popitem(last=False)
+        return view
+
+    def get_sync(self, key, *, prototype=None, byte_range=None):
+        if prototype is None:
+            prototype = default_buffer_prototype()
+        if isinstance(byte_range, SuffixByteRequest):
+            view = self._get_shard_index(key, byte_range)
+        else:
+            view = self.get_entry_view(key, byte_range)
+        if view is None:
+            return None
+        return prototype.buffer.from_array_like(np.frombuffer(view, dtype=np.uint8))
+
+    def set_sync(self, key, value):
+        self._check_writable()
+
+    def delete_sync(self, key):
+        self._check_writable()
+
+    async def get(self, key, prototype, byte_range=None):
+        return self.get_sync(key, prototype=prototype, byte_range=byte_range)
+
+    async def get_partial_values(self, prototype, key_ranges):
+        return [self.get_sync(key, prototype=prototype, byte_range=byte_range) for key, byte_range in key_ranges]
+
+    def get_ranges_sync(self, key, byte_ranges, *, prototype, max_gap_bytes=1 << 20, max_coalesced_bytes=16 << 20):
+        self._ensure_open_sync()
+        index = self.index.lookup.get(key)
+        if index is None:
+            raise BaseExceptionGroup('chunk read failed', [FileNotFoundError(key)])
+        if self.index.compress_types[index] != zipfile.ZIP_STORED:
+            return [(range_index, self.get_sync(key, prototype=prototype, byte_range=byte_range))
+                    for range_index, byte_range in enumerate(byte_ranges)]
+
+        size = int(self.index.sizes[index])
+        data_offset = self.index.get_data_offset(index, self._read)
+        ranges = [(range_index, *get_byte_range(byte_range, size))
+                  for range_index, byte_range in enumerate(byte_ranges)]
+        results = []
+        for group in coalesce_ranges(ranges, max_gap_bytes, max_coalesced_bytes):
+            group_start = group[0][1]
+            group_stop = max(stop for _, _, stop in group)
+            view = self._read(data_offset + group_start, group_stop - group_start)
+            for range_index, start, stop in group:
+                array = np.frombuffer(view[start - group_start:stop - group_start], dtype=np.uint8)
+                results.append((range_index, prototype.buffer.from_array_like(array)))
+        return results
+
+    async def get_ranges(self, key, byte_ranges, *, prototype, max_gap_bytes=1 << 20, max_coalesced_bytes=16 << 20):
+        # all groups are read sequentially from the mapping, in one batch
+        yield self.get_ranges_sync(key, byte_ranges, prototype=prototype, max_gap_bytes=max_gap_bytes,
+                                   max_coalesced_bytes=max_coalesced_bytes)
+
+    async def exists(self, key):
+        self._ensure_open_sync()
+        return key in self.index
+
+    async def getsize(self, key):
+        self._ensure_open_sync()
+        index = self.index.lookup.get(key)
+        if index is None:
+            raise FileNotFoundError(key)
+        return int(self.index.sizes[index])
+
+    async def set(self, key, value):
+        self._check_writable()
+
+    async def delete(self, key):
+        self._check_writable()
+
+    async def list(self):
+        self._ensure_open_sync()
+        for key in self.index.names:
+            yield key
+
+    async def list_prefix(self, prefix):
+        async for key in self.list():
+            if key.startswith(prefix):
+                yield key
+
+    async def list_dir(self, prefix):
+        self._ensure_open_sync()
+        prefix = prefix.rstrip('/')
+        if prefix:
+            prefix += '/'
+        seen = set()
+        for key in self.index.names:
+            if key.startswith(prefix) and key != prefix:
+                child = key[len(prefix):].split('/')[0]
+                if child not in seen:
+                    seen.add(child)
+                    yield child
+
+
+class AsyncOzxStore(OzxStore):
+    """
+    OzxStore variant for concurrent access: instead of a shared mapping, every read is an independent positional
+    read (os.pread, or a file handle per thread where pread is not available) at the precomputed entry offsets,
+    run in a pool of max_concurrency threads, so concurrent get/get_partial_values/get_ranges calls fetch in parallel.
+    """
+
+    # have zarr use the async read path, even though the sync methods are available
+    _supports_sync_io = False
+
+    def __init__(self, path, index=None, sidecar=False, shard_index_cache_size=1024, max_concurrency=32):
+        super().__init__(path, index=index, sidecar=sidecar, shard_index_cache_size=shard_index_cache_size)
+        self.max_concurrency = max_concurrency
+
+    def _sync_open(self):
+        if self._is_open:
+            raise ValueError('store is already open')
+        if self.index is None:
+            self.index = get_zip_index(self.path, sidecar=self.sidecar)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self._local = threading.local()
+        self._files = []
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self._is_open = True
+
+    def close(self):
+        if not self._is_open:
+            return
+        Store.close(self)
+        self._clear_caches()
+        self._executor.shutdown()
+        os.close(self._fd)
+        for file in self._files:
+            file.close()
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for attr in ['_fd', '_local', '_files', '_executor']:
+            state.pop(attr, None)
+        return state
+
+    def __repr__(self):
+        return f"AsyncOzxStore('{self}')"
+
+    def _read(self, offset, size):
+        if hasattr(os, 'pread'):
+            return memoryview(os.pread(self._fd, size, offset))
+        file = getattr(self._local, 'file', None)
+        if file is None:
+            file = self._local.file = open(self.path, 'rb')
+            with self._lock:
+                self._files.append(file)
+        file.seek(offset)
+        return memoryview(file.read(size))
+
+    async def _run(self, function, *args, **kwargs):
+        self._ensure_open_sync()
+        return await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                functools.partial(function, *args, **kwargs))
+
+    async def get(self, key, prototype, byte_range=None):
+        return await self._run(self.get_sync, key, prototype=prototype, byte_range=byte_range)
+
+    async def get_partial_values(self, prototype, key_ranges):
+        return await asyncio.gather(*[self.get(key, prototype, byte_range) for key, byte_range in key_ranges])
+
+    async def get_ranges(self, key, byte_ranges, *, prototype, max_concurrency=10, max_gap_bytes=1 << 20,
+                         max_coalesced_bytes=16 << 20):
+        # One coalesced read per group, at most max_concurrency fetched at a time; batches are yielded in
+        # completion order
+        self._ensure_open_sync()
+        index = self.index.lookup.get(key)
+        if index is None or self.index.compress_types[index] != zipfile.ZIP_STORED:
+            yield await self._run(self.get_ranges_sync, key, byte_ranges, prototype=prototype,
+                                  max_gap_bytes=max_gap_bytes, max_coalesced_bytes=max_coalesced_bytes)
+            return
+        size = int(self.index.sizes[index])
+        ranges = [(range_index, *get_byte_range(byte_range, size))
+                  for range_index, byte_range in enumerate(byte_ranges)]
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(group):
+            group_ranges = [RangeByteRequest(start, stop) for _, start, stop in group]
+            async with semaphore:
+                results = await self._run(self.get_ranges_sync, key, group_ranges, prototype=prototype,
+                                          max_gap_bytes=max_gap_bytes, max_coalesced_bytes=max_coalesced_bytes)
+            return [(group[group_index][0], buffer) for group_index, buffer in results]
+
+        tasks = [asyncio.ensure_future(fetch(group))
+                 for group in coalesce_ranges(ranges, max_gap_bytes, max_coalesced_bytes)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def coalesce_ranges(ranges, max_gap_bytes, max_coalesced_bytes):
+    # Groups (index, start, stop) ranges, sorted by start, into runs that can be read at once
+    groups = []
+    group_stop = None
+    for range1 in sorted(ranges, key=lambda range1: range1[1]):
+        _, start, stop = range1
+        if (groups and start - group_stop <= max_gap_bytes
+                and max(stop, group_stop) - groups[-1][0][1] <= max_coalesced_bytes):
+            groups[-1].append(range1)
+            group_stop = max(stop, group_stop)
+        else:
+            groups.append([range1])
+            group_stop = stop
+    return groups
+
+
+def get_byte_range(byte_range, size):
+    # Returns absolute (start, stop) within an entry of the given size
+    if byte_range is None:
+        return 0, size
+    if isinstance(byte_range, RangeByteRequest):
+        return byte_range.start, min(byte_range.end, size)
+    if isinstance(byte_range, OffsetByteRequest):
+        return byte_range.offset, size
+    if isinstance(byte_range, SuffixByteRequest):
+        return max(0, size - byte_range.suffix), size
+    raise TypeError(f'Unexpected byte_range, got {byte_range}.')
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+TARGET_CHUNK_BYTES = 1024 * 1024
+TARGET_SHARD_BYTES = 64 * 1024 * 1024
+
+
+def round_down_power2(value):
+    return 1 << max(int(value), 1).bit_length() - 1
+
+
+def get_chunk_shape(shape, dtype, dim_order, target_chunk_bytes=TARGET_CHUNK_BYTES):
+    """
+    Square power-of-two x/y chunks of about target_chunk_bytes (single planes along other dimensions), so a viewport
+    read decodes few chunks and each chunk is a reasonable compression unit.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    side = round_down_power2(np.sqrt(max(target_chunk_bytes // itemsize, 1)))
+    return tuple(min(side, size) if dim in 'xy' else 1 for dim, size in zip(dim_order, shape))
+
+
+def get_shard_shape(shape, dtype, dim_order, chunks, target_shard_bytes=TARGET_SHARD_BYTES):
+    """
+    Shards of about target_shard_bytes, as power-of-two multiples of the chunks in x/y, then extended along the
+    other dimensions (innermost first) while within the target, keeping the number of zip entries low.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    chunk_bytes = int(np.prod(chunks)) * itemsize
+    factor = round_down_power2(np.sqrt(max(target_shard_bytes // chunk_bytes, 1)))
+    shards = [min(chunk * factor, -(-size // chunk) * chunk) if dim in 'xy' else chunk
+              for dim, chunk, size in zip(dim_order, chunks, shape)]
+    for axis in reversed(range(len(shape))):
+        if dim_order[axis] not in 'xy':
+            shard_bytes = int(np.prod(shards)) * itemsize
+            nchunks = max(target_shard_bytes // shard_bytes, 1)
+            shards[axis] = min(shards[axis] * nchunks, -(-shape[axis] // chunks[axis]) * chunks[axis])
+    return tuple(shards)
+
+
+def get_level_chunks(level_shapes, chunks, shards):
+    """
+    Chunk and shard shapes per pyramid level: the level 0 shapes clipped to each (smaller) level, so low resolution
+    levels are not stored as padded chunks. Clipping keeps the shard partitioning of each level unchanged.
+    """
+    level_chunks = []
+    for level_shape in level_shapes:
+        chunks1 = tuple(min(chunk, size) for chunk, size in zip(chunks, level_shape))
+        shards1 = tuple(min(shard, -(-size // chunk) * chunk)
+                        for shard, chunk, size in zip(shards, chunks1, level_shape))
+        level_chunks.append((chunks1, shards1))
+    return level_chunks
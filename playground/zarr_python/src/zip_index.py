@@ -0,0 +1,355 @@
+import contextlib
+import functools
+import json
+import os
+import struct
+import zipfile
+import zlib
+
+import numpy as np
+
+
+CENTRAL_DIRECTORY_STRUCT = struct.Struct('<4s4B4HL2L5H2L')
+LOCAL_HEADER_STRUCT = struct.Struct('<4s2B4HL2L2H')
+CENTRAL_DIRECTORY_SIGNATURE = b'PK\x01\x02'
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+END_RECORD_STRUCT = struct.Struct('<4s4H2LH')
+END_RECORD64_STRUCT = struct.Struct('<4sQ2H2L4Q')
+END_RECORD64_LOCATOR_STRUCT = struct.Struct('<4sLQL')
+END_RECORD_SIGNATURE = b'PK\x05\x06'
+END_RECORD64_SIGNATURE = b'PK\x06\x06'
+END_RECORD64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+# end records without comment, and the maximum search window (64 KB comment)
+MIN_TAIL_SIZE = END_RECORD64_STRUCT.size + END_RECORD64_LOCATOR_STRUCT.size + END_RECORD_STRUCT.size
+MAX_TAIL_SIZE = MIN_TAIL_SIZE + 0xFFFF
+ZIP64_EXTRA_ID = 0x0001
+UTF8_FLAG = 0x800
+MAX_UINT32 = 0xFFFFFFFF
+SIDECAR_EXTENSION = '.idx.npz'
+
+
+class ZipEndRecord:
+    """
+    End of archive information: number of entries, central directory offset and size, archive comment, and
+    whether ZIP64 end records are present. offset is the position of the (first) end record; concat is the number
+    of bytes preceding the archive (non-zero if the zip was concatenated to other data).
+    """
+
+    def __init__(self, nentries, cd_offset, cd_size, comment, zip64, offset, concat=0):
+        self.nentries = nentries
+        self.cd_offset = cd_offset
+        self.cd_size = cd_size
+        self.comment = comment
+        self.zip64 = zip64
+        self.offset = offset
+        self.concat = concat
+
+    def __repr__(self):
+        return (f'ZipEndRecord(nentries={self.nentries}, cd_offset={self.cd_offset}, cd_size={self.cd_size}, '
+                f'zip64={self.zip64}, concat={self.concat})')
+
+
+def read_end_record(file, name=None, file_size=None):
+    """
+    Locates and parses the end of central directory record, and the ZIP64 locator and end record if present, from a
+    seekable binary file. Only the end of the file is read: a small block first (archives without comment), then at
+    most the maximum comment size, searched backwards.
+    file_size: end of the archive within the file (by default the end of the file).
+    """
+    if file_size is None:
+        file_size = file.seek(0, os.SEEK_END)
+    tail_size = min(MIN_TAIL_SIZE, file_size)
+    file.seek(file_size - tail_size)
+    tail = file.read(tail_size)
+    position = find_end_record(tail)
+    if position is None and tail_size < min(MAX_TAIL_SIZE, file_size):
+        tail_size = min(MAX_TAIL_SIZE, file_size)
+        file.seek(file_size - tail_size)
+        tail = file.read(tail_size)
+        position = find_end_record(tail)
+    if position is None:
+        raise zipfile.BadZipFile(f'File is not a zip file: {name}')
+    tail_offset = file_size - tail_size
+    (_, disk, cd_disk, _, nentries, cd_size, cd_offset,
+     comment_length) = END_RECORD_STRUCT.unpack_from(tail, position)
+    comment = tail[position + END_RECORD_STRUCT.size:position + END_RECORD_STRUCT.size + comment_length]
+    offset = tail_offset + position
+
+    # ZIP64 locator and end record directly precede the end record (its recorded offset excludes concatenated data)
+    records_size = END_RECORD64_STRUCT.size + END_RECORD64_LOCATOR_STRUCT.size
+    if position >= records_size:
+        records = tail[position - records_size:position]
+    else:
+        file.seek(max(offset - records_size, 0))
+        records = file.read(min(records_size, offset))
+    zip64 = False
+    locator_position = len(records) - END_RECORD64_LOCATOR_STRUCT.size
+    if locator_position >= 0 and records[locator_position:locator_position + 4] == END_RECORD64_LOCATOR_SIGNATURE:
+        _, _, _, ndisks = END_RECORD64_LOCATOR_STRUCT.unpack_from(records, locator_position)
+        if ndisks > 1:
+            raise zipfile.BadZipFile(f'Multi-disk zip files are not supported: {name}')
+        if len(records) < records_size or records[:4] != END_RECORD64_SIGNATURE:
+            raise zipfile.BadZipFile(f'Corrupt ZIP64 end of central directory record: {name}')
+        (_, _, _, _, disk, cd_disk, _, nentries, cd_size,
+         cd_offset) = END_RECORD64_STRUCT.unpack_from(records)
+        zip64 = True
+        offset -= records_size
+    if disk != 0 or cd_disk != 0:
+        raise zipfile.BadZipFile(f'Multi-disk zip files are not supported: {name}')
+    concat = offset - cd_size - cd_offset
+    if concat < 0:
+        raise zipfile.BadZipFile(f'Corrupt end of central directory record: {name}')
+    return ZipEndRecord(nentries, cd_offset, cd_size, comment, zip64, offset, concat)
+
+
+def find_end_record(tail):
+    # Position of the end of central directory record in the tail of a file: the last signature whose comment
+    # length matches the remaining bytes (a comment may itself contain the signature)
+    position = len(tail)
+    while (position := tail.rfind(END_RECORD_SIGNATURE, 0, position)) >= 0:
+        if position + END_RECORD_STRUCT.size <= len(tail):
+            comment_length = END_RECORD_STRUCT.unpack_from(tail, position)[-1]
+            if position + END_RECORD_STRUCT.size + comment_length == len(tail):
+                return position
+    return None
+
+
+class ZipIndex:
+    """
+    Central directory index of a zip file: entry name -> local header offset, sizes, CRC-32 and compression type,
+    stored in compact arrays. The offset of the entry data (after the variable-size local header) is resolved
+    lazily per entry.
+    """
+
+    def __init__(self, names, header_offsets, compressed_sizes, sizes, crcs, compress_types, comment=b'',
+                 zip64=False, data_offsets=None):
+        self.names = list(names)
+        self.lookup = {name: index for index, name in enumerate(self.names)}
+        self.header_offsets = np.asarray(header_offsets, dtype=np.uint64)
+        self.compressed_sizes = np.asarray(compressed_sizes, dtype=np.uint64)
+        self.sizes = np.asarray(sizes, dtype=np.uint64)
+        self.crcs = np.asarray(crcs, dtype=np.uint32)
+        self.compress_types = np.asarray(compress_types, dtype=np.uint16)
+        if data_offsets is None:
+            data_offsets = np.full(len(self.names), -1, dtype=np.int64)
+        self.data_offsets = np.asarray(data_offsets, dtype=np.int64)
+        self.comment = comment
+        self.zip64 = zip64
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.lookup
+
+    def get_data_offset(self, index, read):
+        # read(offset, size) -> bytes; only the fixed part of the local header is needed
+        data_offset = int(self.data_offsets[index])
+        if data_offset < 0:
+            header_offset = int(self.header_offsets[index])
+            header = read(header_offset, LOCAL_HEADER_STRUCT.size)
+            if len(header) != LOCAL_HEADER_STRUCT.size or header[:4] != LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f'Bad local header for entry {self.names[index]}')
+            fields = LOCAL_HEADER_STRUCT.unpack(header)
+            data_offset = header_offset + LOCAL_HEADER_STRUCT.size + fields[10] + fields[11]
+            self.data_offsets[index] = data_offset
+        return data_offset
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename, 'rb') as file:
+            return cls.from_fileobj(file, filename)
+
+    @classmethod
+    def from_fileobj(cls, file, name=None, file_size=None):
+        # file: seekable binary file-like object (a local file, or e.g. a file over HTTP range requests)
+        end_record = read_end_record(file, name, file_size)
+        file.seek(end_record.cd_offset + end_record.concat)
+        central_directory = file.read(end_record.cd_size)
+        if len(central_directory) != end_record.cd_size:
+            raise zipfile.BadZipFile(f'Truncated central directory: {name}')
+        return cls(*parse_central_directory(central_directory, end_record.concat), comment=end_record.comment,
+                   zip64=end_record.zip64)
+
+    def save(self, filename, stamp):
+        with open(filename, 'wb') as file:
+            np.savez(file, names=np.array(self.names, dtype=str), header_offsets=self.header_offsets,
+                     compressed_sizes=self.compressed_sizes, sizes=self.sizes, crcs=self.crcs,
+                     compress_types=self.compress_types, data_offsets=self.data_offsets,
+                     comment=np.frombuffer(self.comment, dtype=np.uint8), zip64=self.zip64,
+                     stamp=np.array(stamp, dtype=np.int64))
+
+    @classmethod
+    def load(cls, filename, stamp):
+        # Returns None if the sidecar is missing or does not match the current file (get_index_stamp)
+        try:
+            with np.load(filename) as arrays:
+                if tuple(arrays['stamp']) != tuple(stamp):
+                    return None
+                return cls(arrays['names'].tolist(), arrays['header_offsets'], arrays['compressed_sizes'],
+                           arrays['sizes'], arrays['crcs'], arrays['compress_types'],
+                           comment=arrays['comment'].tobytes(), zip64=bool(arrays['zip64']),
+                           data_offsets=arrays['data_offsets'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def parse_central_directory(data, concat=0):
+    names, header_offsets, compressed_sizes, sizes, crcs, compress_types = [], [], [], [], [], []
+    position = 0
+    size = len(data)
+    unpack_from = CENTRAL_DIRECTORY_STRUCT.unpack_from
+    header_size = CENTRAL_DIRECTORY_STRUCT.size
+    while position < size:
+        if size - position < header_size:
+            raise zipfile.BadZipFile('Truncated central directory')
+        (signature, _, _, _, _, flags, compress_type, _, _, crc, compressed_size, file_size,
+         name_length, extra_length, comment_length, _, _, _, header_offset) = unpack_from(data, position)
+        if signature != CENTRAL_DIRECTORY_SIGNATURE:
+            raise zipfile.BadZipFile('Bad magic number for central directory')
+        position += header_size
+        name = data[position:position + name_length]
+        name = name.decode('utf-8' if flags & UTF8_FLAG else 'cp437')
+        position += name_length
+        if MAX_UINT32 in (file_size, compressed_size, header_offset):
+            file_size, compressed_size, header_offset = parse_zip64_extra(
+                data[position:position + extra_length], file_size, compressed_size, header_offset)
+        position += extra_length + comment_length
+
+        names.append(name)
+        header_offsets.append(header_offset + concat)
+        compressed_sizes.append(compressed_size)
+        sizes.append(file_size)
+        crcs.append(crc)
+        compress_types.append(compress_type)
+    return names, header_offsets, compressed_sizes, sizes, crcs, compress_types
+
+
+def parse_zip64_extra(extra, file_size, compressed_size, header_offset):
+    position = 0
+    while position + 4 <= len(extra):
+        extra_id, extra_size = struct.unpack_from('<2H', extra, position)
+        position += 4
+        if extra_id == ZIP64_EXTRA_ID:
+            # only the fields that overflowed are present, in this order
+            values = iter(struct.unpack_from(f'<{extra_size // 8}Q', extra, position))
+            if file_size == MAX_UINT32:
+                file_size = next(values)
+            if compressed_size == MAX_UINT32:
+                compressed_size = next(values)
+            if header_offset == MAX_UINT32:
+                header_offset = next(values)
+            break
+        position += extra_size
+    return file_size, compressed_size, header_offset
+
+
+def get_zip_index(filename, sidecar=False):
+    """
+    Returns the (cached) central directory index of a zip file. The cache is keyed by file size and mtime, and the
+    CRC-32 of the central directory (see get_index_stamp), so a modified file is parsed again. With sidecar=True the
+    index is also persisted next to the file.
+    """
+    stamp = get_index_stamp(filename)
+    return _get_zip_index(os.path.abspath(filename), stamp, sidecar)
+
+
+def get_index_stamp(filename):
+    """
+    Returns (size, mtime, end record offset, central directory CRC-32) of a zip file. Size and mtime alone do not
+    identify a file rewritten in place at the same size within the mtime resolution of the file system; reading and
+    checksumming the central directory is still much cheaper than parsing it.
+    """
+    stat = os.stat(filename)
+    with open(filename, 'rb') as file:
+        end_record = read_end_record(file, filename)
+        file.seek(end_record.cd_offset + end_record.concat)
+        crc = zlib.crc32(file.read(end_record.cd_size))
+    return stat.st_size, stat.st_mtime_ns, end_record.offset, crc
+
+
+def clear_zip_index_cache():
+    # Drops the cached indexes of get_zip_index (e.g. to time cold opens)
+    _get_zip_index.cache_clear()
+
+
+@functools.lru_cache(maxsize=16)
+def _get_zip_index(filename, stamp, sidecar):
+    sidecar_filename = filename + SIDECAR_EXTENSION
+    if sidecar:
+        index = ZipIndex.load(sidecar_filename, stamp)
+        if index is not None:
+            return index
+    index = ZipIndex.from_file(filename)
+    if sidecar:
+        index.save(sidecar_filename, stamp)
+    return index
+
+
+def read_metadata_documents(filename, index, metadata_filename='zarr.json'):
+    """
+    Returns the metadata of the whole hierarchy as node path -> metadata dict ('' for the root). Uses the
+    consolidated metadata in the root zarr.json when present (a single entry read), else reads all zarr.json entries.
+    """
+    root_document = read_metadata_entries(filename, index, metadata_filename, root_only=True).get('')
+    documents = get_consolidated_documents(root_document) if root_document is not None else None
+    if documents is None:
+        documents = read_metadata_entries(filename, index, metadata_filename)
+    return documents
+
+
+def get_consolidated_documents(root_document):
+    # Node path -> metadata dict from (zarr v3, inline) consolidated metadata, or None if not present
+    consolidated = root_document.get('consolidated_metadata')
+    if not consolidated or consolidated.get('kind') != 'inline':
+        return None
+    documents = {'': root_document}
+    documents.update(consolidated.get('metadata', {}))
+    # same documents as the per node zarr.json entries
+    return {path: {key: value for key, value in document.items() if key != 'consolidated_metadata'}
+            for path, document in documents.items()}
+
+
+def read_metadata_entries(filename, index, metadata_filename='zarr.json', max_span=64 * 1024 * 1024,
+                          root_only=False):
+    """
+    Reads and parses all metadata (zarr.json) entries, returned as node path -> metadata dict ('' for the root).
+    As RFC-9 places these entries at the start of the archive, they are normally fetched with one sequential read.
+    filename can also be a seekable binary file-like object.
+    """
+    if root_only:
+        indices = [index.lookup[metadata_filename]] if metadata_filename in index else []
+    else:
+        indices = [index1 for index1, name in enumerate(index.names) if name.split('/')[-1] == metadata_filename]
+    indices.sort(key=lambda index1: index.header_offsets[index1])
+    documents = {}
+    if not indices:
+        return documents
+    with contextlib.nullcontext(filename) if hasattr(filename, 'read') else open(filename, 'rb') as file:
+        file_size = file.seek(0, os.SEEK_END)
+        span_start = int(index.header_offsets[indices[0]])
+        # the local header of the last entry has at most 2 * 64 KB of (variable) name and extra fields
+        span_end = min(int(index.header_offsets[indices[-1]]) + LOCAL_HEADER_STRUCT.size + 2 * 0x10000
+                       + int(index.compressed_sizes[indices[-1]]), file_size)
+        span = b''
+        if span_end - span_start <= max_span:
+            file.seek(span_start)
+            span = file.read(span_end - span_start)
+
+        def read(offset, size):
+            if span_start <= offset and offset + size <= span_start + len(span):
+                return span[offset - span_start:offset - span_start + size]
+            file.seek(offset)
+            return file.read(size)
+
+        for index1 in indices:
+            data_offset = index.get_data_offset(index1, read)
+            data = read(data_offset, int(index.compressed_sizes[index1]))
+            if index.compress_types[index1] == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(data, -15)
+            elif index.compress_types[index1] != zipfile.ZIP_STORED:
+                # a passed file object is not closed by zipfile
+                with zipfile.ZipFile(filename) as zip:
+                    data = zip.read(index.names[index1])
+            documents[os.path.dirname(index.names[index1])] = json.loads(data)
+    return documents
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+
+from zarr.storage import WrapperStore
+
+
+METADATA_FILENAME = 'zarr.json'
+# latency histogram buckets: upper bounds of 2^n microseconds
+NBUCKETS = 32
+
+
+class StoreStats:
+    """
+    Thread-safe per-operation statistics: call count, bytes returned, total time and a log2 latency histogram
+    (microseconds).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def record(self, operation, nbytes, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), NBUCKETS - 1)
+        with self.lock:
+            stats = self.operations.get(operation)
+            if stats is None:
+                stats = self.operations[operation] = {'count': 0, 'bytes': 0, 'seconds': 0.0,
+                                                      'histogram': [0] * NBUCKETS}
+            stats['count'] += 1
+            stats['bytes'] += nbytes
+            stats['seconds'] += seconds
+            stats['histogram'][bucket] += 1
+
+    def reset(self):
+        with self.lock:
+            self.operations.clear()
+
+    def get_stats(self):
+        """
+        Returns operation -> count, bytes, seconds, mean_us and histogram ({'<=N us': count} for non-empty buckets).
+        """
+        with self.lock:
+            result = {}
+            for operation, stats in self.operations.items():
+                result[operation] = {
+                    'count': stats['count'],
+                    'bytes': stats['bytes'],
+                    'seconds': stats['seconds'],
+                    'mean_us': stats['seconds'] * 1e6 / stats['count'],
+                    'histogram': {f'<={1 << bucket}us': count
+                                  for bucket, count in enumerate(stats['histogram']) if count},
+                }
+            return result
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.get_stats(), **kwargs)
+
+    def dump(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.get_stats(), file, indent=2)
+
+
+def get_nbytes(buffer):
+    return len(buffer) if buffer is not None else 0
+
+
+def get_operation(key, byte_range):
+    if key.split('/')[-1] == METADATA_FILENAME:
+        return 'metadata'
+    return 'get' if byte_range is None else 'partial_get'
+
+
+class InstrumentedStore(WrapperStore):
+    """
+    Store wrapper recording the latency and size of each operation on the wrapped (zip) store in a StoreStats:
+    open, metadata (zarr.json reads), get, partial_get, ranges (coalesced shard reads), exists and list.
+    Instrumentation is opt-in: unwrapped stores have no overhead.
+    """
+
+    def __init__(self, store, stats=None):
+        super().__init__(store)
+        self.stats = stats if stats is not None else StoreStats()
+
+    def _with_store(self, store):
+        return type(self)(store, self.stats)
+
+    def __repr__(self):
+        return f'InstrumentedStore({self._store!r})'
+
+    async def _ensure_open(self):
+        if not self._store._is_open:
+            start = time.perf_counter()
+            await self._store._ensure_open()
+            self.stats.record('open', 0, time.perf_counter() - start)
+
+    async def get(self, key, prototype, byte_range=None):
+        start = time.perf_counter()
+        buffer = await self._store.get(key, prototype, byte_range)
+        self.stats.record(get_operation(key, byte_range), get_nbytes(buffer), time.perf_counter() - start)
+        return buffer
+
+    def get_sync(self, key, *, prototype=None, byte_range=None):
+        start = time.perf_counter()
+        buffer = self._store.get_sync(key, prototype=prototype, byte_range=byte_range)
+        self.stats.record(get_operation(key, byte_range), get_nbytes(buffer), time.perf_counter() - start)
+        return buffer
+
+    async def get_partial_values(self, prototype, key_ranges):
+        start = time.perf_counter()
+        buffers = await self._store.get_partial_values(prototype, key_ranges)
+        self.stats.record('partial_get', sum(map(get_nbytes, buffers)), time.perf_counter() - start)
+        return buffers
+
+    async def get_ranges(self, key, byte_ranges, *, prototype, **kwargs):
+        start = time.perf_counter()
+        nbytes = 0
+        async for group in self._store.get_ranges(key, byte_ranges, prototype=prototype, **kwargs):
+            nbytes += sum(get_nbytes(buffer) for _, buffer in group)
+            yield group
+        self.stats.record('ranges', nbytes, time.perf_counter() - start)
+
+    def get_ranges_sync(self, key, byte_ranges, *, prototype, **kwargs):
+        start = time.perf_counter()
+        results = self._store.get_ranges_sync(key, byte_ranges, prototype=prototype, **kwargs)
+        self.stats.record('ranges', sum(get_nbytes(buffer) for _, buffer in results), time.perf_counter() - start)
+        return results
+
+    async def exists(self, key):
+        start = time.perf_counter()
+        result = await self._store.exists(key)
+        self.stats.record('exists', 0, time.perf_counter() - start)
+        return result
+
+    async def _list(self, keys):
+        start = time.perf_counter()
+        async for key in keys:
+            yield key
+        self.stats.record('list', 0, time.perf_counter() - start)
+
+    def list(self):
+        return self._list(self._store.list())
+
+    def list_prefix(self, prefix):
+        return self._list(self._store.list_prefix(prefix))
+
+    def list_dir(self, prefix):
+        return self._list(self._store.list_dir(prefix))
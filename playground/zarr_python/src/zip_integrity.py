@@ -0,0 +1,208 @@
+import os
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from playground.zarr_python.src.zip_index import get_zip_index
+
+
+METADATA_FILENAME = 'zarr.json'
+BLOCK_SIZE = 16 * 1024 * 1024
+# shard index entry (offset, nbytes) of a missing chunk
+EMPTY_CHUNK = 2 ** 64 - 1
+
+
+class SpanReader:
+    """
+    Sequential reader over a span of the archive: reads blocks of at least block_size bytes, so the local headers and
+    data of consecutive entries are fetched with few large reads.
+    """
+
+    def __init__(self, file, block_size=BLOCK_SIZE, end=None):
+        self.file = file
+        self.block_size = block_size
+        # blocks are not read beyond end (the start of the next span)
+        self.end = end
+        self.block_offset = 0
+        self.block = b''
+        self.nbytes = 0
+
+    def read(self, offset, size):
+        start = offset - self.block_offset
+        if start < 0 or start + size > len(self.block):
+            self.file.seek(offset)
+            block_size = self.block_size if self.end is None else min(self.block_size, self.end - offset)
+            self.block = self.file.read(max(size, block_size))
+            self.block_offset = offset
+            self.nbytes += len(self.block)
+            start = 0
+        return memoryview(self.block)[start:start + size]
+
+    def read_upto(self, offset, size):
+        # Returns at most size bytes from offset: what remains of the current block, else the next block
+        start = offset - self.block_offset
+        if 0 <= start < len(self.block):
+            return memoryview(self.block)[start:start + size]
+        return self.read(offset, min(size, self.block_size))
+
+
+def get_shard_layouts(documents):
+    """
+    Returns array path -> (number of chunks per shard, index location, whether the index has a crc32c checksum) for
+    the sharded arrays in node path -> zarr.json documents.
+    """
+    layouts = {}
+    for path, document in documents.items():
+        if document.get('node_type') != 'array':
+            continue
+        for codec in document.get('codecs', []):
+            if codec.get('name') == 'sharding_indexed':
+                configuration = codec['configuration']
+                shard_shape = document['chunk_grid']['configuration']['chunk_shape']
+                nchunks = int(np.prod([shard // chunk for shard, chunk
+                                       in zip(shard_shape, configuration['chunk_shape'])]))
+                index_codecs = [codec1.get('name') for codec1 in configuration.get('index_codecs', [])]
+                layouts[path] = (nchunks, configuration.get('index_location', 'end'), 'crc32c' in index_codecs)
+    return layouts
+
+
+def get_shard_layout(name, layouts):
+    # Shard layout of a chunk entry of a sharded array, or None
+    if os.path.basename(name) == METADATA_FILENAME:
+        return None
+    path = os.path.dirname(name)
+    while True:
+        if path in layouts:
+            return layouts[path]
+        if not path:
+            return None
+        path = os.path.dirname(path)
+
+
+def check_shard_index(data_size, read, layout):
+    """
+    Decodes a shard index (read(offset, size) within the entry data) and checks its checksum and that all chunk
+    ranges lie within the shard. Returns an error message, or None.
+    """
+    nchunks, location, checksum = layout
+    index_size = nchunks * 16 + (4 if checksum else 0)
+    if data_size < index_size:
+        return f'shard of {data_size} bytes is smaller than its index ({index_size} bytes)'
+    index_offset = data_size - index_size if location == 'end' else 0
+    index_bytes = bytes(read(index_offset, index_size))
+    if checksum:
+        # only needed for crc32c index codecs (installed with zarr, which uses it for that codec)
+        import google_crc32c
+
+        expected = struct.unpack('<I', index_bytes[-4:])[0]
+        if google_crc32c.value(index_bytes[:-4]) != expected:
+            return 'shard index checksum mismatch'
+    offsets = np.frombuffer(index_bytes, dtype='<u8', count=nchunks * 2).reshape(nchunks, 2)
+    offsets = offsets[~np.all(offsets == EMPTY_CHUNK, axis=1)]
+    data_start, data_end = (0, data_size - index_size) if location == 'end' else (index_size, data_size)
+    # compared without computing offset + nbytes, which wraps around in uint64 for corrupted values
+    if (np.any(offsets[:, 0] < data_start) or np.any(offsets[:, 0] > data_end)
+            or np.any(offsets[:, 1] > data_end - offsets[:, 0])):
+        return 'shard index references data outside the shard'
+    return None
+
+
+def get_spans(index, block_size):
+    # Groups entries, in archive order, into spans of about block_size bytes (each verified by one worker);
+    # returns (entry indices, offset of the next span or None)
+    order = np.argsort(index.header_offsets, kind='stable')
+    spans, span, span_size = [], [], 0
+    for entry_index in order.tolist():
+        if span_size >= block_size:
+            spans.append((span, int(index.header_offsets[entry_index])))
+            span, span_size = [], 0
+        span.append(entry_index)
+        span_size += int(index.compressed_sizes[entry_index])
+    if span:
+        spans.append((span, None))
+    return spans
+
+
+def verify_span(filename, index, entry_indices, end, block_size, layouts):
+    # Returns (entry name, error) of the corrupted entries, and the number of bytes read
+    with open(filename, 'rb', buffering=0) as file:
+        return verify_entries(filename, SpanReader(file, block_size, end), index, entry_indices, layouts)
+
+
+def verify_entries(filename, reader, index, entry_indices, layouts):
+    errors = []
+    for entry_index in entry_indices:
+        name = index.names[entry_index]
+        try:
+            data_offset = index.get_data_offset(entry_index, reader.read)
+            compressed_size = int(index.compressed_sizes[entry_index])
+            compress_type = int(index.compress_types[entry_index])
+            crc = 0
+            if compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                decompressor = zlib.decompressobj(-15) if compress_type == zipfile.ZIP_DEFLATED else None
+                position = 0
+                while position < compressed_size:
+                    data = reader.read_upto(data_offset + position, compressed_size - position)
+                    if len(data) == 0:
+                        raise EOFError('entry data truncated')
+                    position += len(data)
+                    crc = zlib.crc32(decompressor.decompress(data) if decompressor is not None else data, crc)
+                if decompressor is not None:
+                    crc = zlib.crc32(decompressor.flush(), crc)
+            else:
+                with zipfile.ZipFile(filename) as zip_file:
+                    crc = zlib.crc32(zip_file.read(name))
+            if crc != int(index.crcs[entry_index]):
+                errors.append((name, f'CRC-32 mismatch: {crc:08x} != {int(index.crcs[entry_index]):08x}'))
+                continue
+            layout = get_shard_layout(name, layouts) if layouts else None
+            if layout is not None and compress_type == zipfile.ZIP_STORED:
+                error = check_shard_index(compressed_size,
+                                          lambda offset, size: reader.read(data_offset + offset, size), layout)
+                if error is not None:
+                    errors.append((name, error))
+        except Exception as error:
+            errors.append((name, f'{type(error).__name__}: {error}'))
+    return errors, reader.nbytes
+
+
+def verify_zip(filename, index=None, documents=None, check_shard_indexes=False, max_workers=None,
+               block_size=BLOCK_SIZE):
+    """
+    Verifies the CRC-32 of all entries of a zip file against its central directory, and optionally decodes and
+    checks the shard index of every shard entry (documents: node path -> zarr.json metadata, for the shard layouts).
+    Entries are read in archive order in spans of large sequential reads, verified in parallel threads (zlib and
+    file reads release the GIL).
+    Returns a report with the number of entries and bytes checked, time, throughput and the corrupted entries.
+    """
+    if index is None:
+        index = get_zip_index(filename)
+    if check_shard_indexes and documents is None:
+        raise ValueError('documents (zarr.json metadata) are required to check shard indexes')
+    layouts = get_shard_layouts(documents) if check_shard_indexes else {}
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    corrupted = []
+    nbytes_read = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(verify_span, filename, index, span, end, block_size, layouts)
+                   for span, end in get_spans(index, block_size)]
+        for future in futures:
+            errors, nbytes = future.result()
+            corrupted.extend(errors)
+            nbytes_read += nbytes
+    seconds = time.perf_counter() - start
+    nbytes = int(index.compressed_sizes.sum())
+    return {
+        'entries': len(index),
+        'bytes': nbytes,
+        'bytes_read': nbytes_read,
+        'seconds': seconds,
+        'mb_s': nbytes / seconds / 1e6 if seconds > 0 else 0,
+        'corrupted': [{'name': name, 'error': error} for name, error in sorted(corrupted)],
+    }
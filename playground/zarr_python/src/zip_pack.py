@@ -0,0 +1,185 @@
+import json
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from playground.zarr_python.src.zip_index import END_RECORD_SIGNATURE, END_RECORD_STRUCT, ZipIndex
+from playground.zarr_python.src.zip_writer import StoredZipWriter, sort_breadth_first
+
+
+METADATA_FILENAME = 'zarr.json'
+
+
+def get_pack_entries(directory):
+    """
+    Returns the relative (zip) names of all files in a zarr directory in RFC-9 order: the root zarr.json first,
+    other zarr.json files in breadth-first order, then all other (chunk/shard) files.
+    """
+    names = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        relative_path = os.path.relpath(dirpath, directory).replace(os.sep, '/')
+        for filename in filenames:
+            names.append(filename if relative_path == '.' else f'{relative_path}/{filename}')
+    return sort_entries(names)
+
+
+def sort_entries(names):
+    metadata_names, data_names = [], []
+    for name in names:
+        if name.split('/')[-1] == METADATA_FILENAME:
+            metadata_names.append(name)
+        else:
+            data_names.append(name)
+    return sort_breadth_first(metadata_names) + sorted(data_names)
+
+
+def get_ome_comment(directory):
+    with open(os.path.join(directory, METADATA_FILENAME), 'rb') as file:
+        root_metadata = json.load(file)
+    ome = root_metadata.get('attributes', {}).get('ome', {})
+    if 'version' not in ome:
+        return b''
+    return json.dumps({'ome': {'version': ome['version']}}).encode('utf-8')
+
+
+def read_entry(filename, max_buffer_size):
+    # Small files are returned in memory with their CRC; large files are copied later, and their CRC computed
+    # during the copy (a single read)
+    size = os.path.getsize(filename)
+    if size <= max_buffer_size:
+        with open(filename, 'rb') as file:
+            data = file.read()
+        return len(data), zlib.crc32(data), data
+    return size, None, None
+
+
+def pack_zarr(directory, uri, max_workers=None, max_buffer_size=8 * 1024 * 1024, max_pending=64):
+    """
+    Packs an existing (OME-)Zarr v3 directory into an RFC-9 zip file without decoding or re-encoding: entries are
+    copied byte for byte into an uncompressed ZIP64 archive, with the zarr.json files first in breadth-first order
+    and the OME version in the archive comment.
+    Small files are read and checksummed ahead in a thread pool, while the archive is written sequentially. The
+    archive is written to a temporary file, moved to uri when complete.
+    """
+    if not os.path.isfile(os.path.join(directory, METADATA_FILENAME)):
+        raise ValueError(f'No root {METADATA_FILENAME} found in {directory}')
+    names = get_pack_entries(directory)
+    comment = get_ome_comment(directory)
+    temp_uri = uri + '.tmp'
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, StoredZipWriter(temp_uri) as writer:
+            pending = deque()
+            names_iter = iter(names)
+            for name in names_iter:
+                pending.append((name, executor.submit(read_entry, os.path.join(directory, name), max_buffer_size)))
+                if len(pending) >= max_pending:
+                    break
+            while pending:
+                name, future = pending.popleft()
+                for name1 in names_iter:
+                    pending.append((name1, executor.submit(read_entry, os.path.join(directory, name1),
+                                                           max_buffer_size)))
+                    break
+                size, crc, data = future.result()
+                if data is not None:
+                    writer.write(name, data, crc=crc)
+                else:
+                    writer.write_file(name, os.path.join(directory, name), size=size)
+            writer.close(comment)
+        os.replace(temp_uri, uri)
+    except BaseException:
+        if os.path.exists(temp_uri):
+            os.remove(temp_uri)
+        raise
+
+
+def compact_zip(uri, target=None, max_buffer_size=8 * 1024 * 1024):
+    """
+    Rewrites an uncompressed archive, e.g. after appends (zip_zarr_writer.zip_zarr_append), in RFC-9 order: zarr.json
+    entries first in breadth-first order, then all other entries, leaving out unreferenced data. Entries are copied
+    byte for byte. Without target, the archive is replaced.
+    """
+    index = ZipIndex.from_file(uri)
+    if index.compress_types.any():
+        raise ValueError(f'Cannot compact a zip file with compressed entries: {uri}')
+    output = target if target is not None else f'{uri}.compact'
+    try:
+        with open(uri, 'rb') as file, StoredZipWriter(output) as writer:
+            def read(offset, size):
+                file.seek(offset)
+                return file.read(size)
+
+            for name in sort_entries(index.names):
+                index1 = index.lookup[name]
+                offset = index.get_data_offset(index1, read)
+                size, crc = int(index.sizes[index1]), int(index.crcs[index1])
+                if size <= max_buffer_size:
+                    writer.write(name, read(offset, size), crc=crc)
+                else:
+                    writer.write_file(name, uri, size=size, crc=crc, offset=offset)
+            writer.close(index.comment)
+        if target is None:
+            os.replace(output, uri)
+    except BaseException:
+        if os.path.exists(output):
+            os.remove(output)
+        raise
+
+
+def recover_zip(uri, block_size=16 * 1024 * 1024):
+    """
+    Restores an archive after an interrupted append (StoredZipWriter mode 'a'), which leaves new data after the end
+    records of the original archive: the file is truncated after the last end of central directory record that
+    references a valid central directory. Returns the recovered size, or None if the archive is intact.
+    """
+    with open(uri, 'r+b') as file:
+        try:
+            ZipIndex.from_fileobj(file, uri)
+            return None
+        except zipfile.BadZipFile:
+            pass
+        file_size = file.seek(0, os.SEEK_END)
+        # search backwards in blocks, overlapping by the signature size
+        end = file_size
+        while end > 0:
+            start = max(end - block_size, 0)
+            file.seek(start)
+            block = file.read(min(end + len(END_RECORD_SIGNATURE) - 1, file_size) - start)
+            position = len(block)
+            while (position := block.rfind(END_RECORD_SIGNATURE, 0, position)) >= 0:
+                record = block[position:position + END_RECORD_STRUCT.size]
+                if len(record) < END_RECORD_STRUCT.size:
+                    file.seek(start + position)
+                    record = file.read(END_RECORD_STRUCT.size)
+                if len(record) < END_RECORD_STRUCT.size:
+                    continue
+                archive_size = start + position + END_RECORD_STRUCT.size + END_RECORD_STRUCT.unpack(record)[-1]
+                if archive_size > file_size:
+                    continue
+                try:
+                    ZipIndex.from_fileobj(file, uri, file_size=archive_size)
+                except (zipfile.BadZipFile, ValueError):
+                    continue
+                file.truncate(archive_size)
+                return archive_size
+            end = start
+    raise zipfile.BadZipFile(f'No valid end of central directory record found: {uri}')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pack an OME-Zarr directory into an RFC-9 zip (.ozx) file, '
+                                                 'or compact an .ozx file into RFC-9 order')
+    parser.add_argument('source', help='OME-Zarr (v3) directory, or .ozx file to compact')
+    parser.add_argument('target', nargs='?', help='output .ozx file (default for compaction: replace source)')
+    parser.add_argument('--workers', type=int, default=None, help='number of file reader threads')
+    args = parser.parse_args()
+    if os.path.isdir(args.source):
+        if args.target is None:
+            parser.error('target is required to pack a directory')
+        pack_zarr(args.source, args.target, max_workers=args.workers)
+    else:
+        compact_zip(args.source, args.target)
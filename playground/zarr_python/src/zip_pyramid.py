@@ -0,0 +1,209 @@
+import itertools
+
+import numpy as np
+
+
+DOWNSAMPLE_METHODS = ['mean', 'mode', 'nearest']
+
+
+class PyramidBuilder:
+    """
+    Builds all pyramid levels in one traversal over the input tiles. Tiles are assembled into shard buffers per
+    level; a completed shard is written (directly, or through a ParallelShardWriter), then downsampled straight
+    into its region of the next level's shard buffer.
+
+    method: 'mean' for intensity images, 'mode' for label images, or 'nearest'.
+    """
+
+    def __init__(self, zarr_datas, dim_order, downscale=2, method='mean', max_pending_shards=16,
+                 shard_writer=None):
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f'Unsupported downsample method {method}, expected one of {DOWNSAMPLE_METHODS}')
+        self.zarr_datas = zarr_datas
+        self.dim_order = dim_order
+        self.downscale = downscale
+        self.method = method
+        self.max_pending_shards = max_pending_shards
+        self.shard_writer = shard_writer
+        # per level: shard index -> [buffer, number of elements filled]
+        self.pending = [{} for _ in zarr_datas]
+
+    @property
+    def npending(self):
+        return sum(len(pending) for pending in self.pending)
+
+    def _get_shard(self, level, shard_index):
+        zarr_data = self.zarr_datas[level]
+        shard_start = [index * shard for index, shard in zip(shard_index, zarr_data.shards)]
+        shard_end = [min(start + shard, size) for start, shard, size in zip(shard_start, zarr_data.shards,
+                                                                             zarr_data.shape)]
+        return shard_start, shard_end
+
+    def _get_pending(self, level, shard_index, shard_start, shard_end):
+        pending = self.pending[level]
+        if shard_index not in pending:
+            if self.npending >= self.max_pending_shards:
+                raise ValueError(f'More than {self.max_pending_shards} incomplete shards pending; '
+                                 'provide tiles in shard order or increase max_pending_shards')
+            buffer_shape = [end - start for start, end in zip(shard_start, shard_end)]
+            pending[shard_index] = [np.empty(buffer_shape, dtype=self.zarr_datas[level].dtype), 0]
+        return pending[shard_index]
+
+    def _add_filled(self, level, shard_index, shard_start, entry, nfilled):
+        entry[1] += nfilled
+        if entry[1] >= entry[0].size:
+            del self.pending[level][shard_index]
+            self._write_shard(level, shard_start, entry[0])
+
+    def write_tile(self, level, offset, tile):
+        shape, shard_shape = self.zarr_datas[level].shape, self.zarr_datas[level].shards
+        end = [min(start + size, size1) for start, size, size1 in zip(offset, tile.shape, shape)]
+        index_ranges = [range(start // shard, (end1 - 1) // shard + 1)
+                        for start, end1, shard in zip(offset, end, shard_shape)]
+        for shard_index in itertools.product(*index_ranges):
+            shard_start, shard_end = self._get_shard(level, shard_index)
+            overlap_start = [max(start, start1) for start, start1 in zip(offset, shard_start)]
+            overlap_end = [min(end1, end2) for end1, end2 in zip(end, shard_end)]
+            tile_slices = tuple(slice(start - start1, end1 - start1)
+                                for start, end1, start1 in zip(overlap_start, overlap_end, offset))
+            if (shard_index not in self.pending[level] and overlap_start == shard_start
+                    and overlap_end == shard_end):
+                # tile covers the whole shard: no need to assemble a shard buffer. A shard writer encodes it later
+                # (on a worker thread, or pickled by a feeder thread): copy, as the caller may reuse the tile buffer
+                shard = tile[tile_slices]
+                self._write_shard(level, shard_start, shard.copy() if self.shard_writer is not None else shard)
+                continue
+            entry = self._get_pending(level, shard_index, shard_start, shard_end)
+            buffer_slices = tuple(slice(start - start1, end1 - start1)
+                                  for start, end1, start1 in zip(overlap_start, overlap_end, shard_start))
+            entry[0][buffer_slices] = tile[tile_slices]
+            nfilled = int(np.prod([end1 - start for start, end1 in zip(overlap_start, overlap_end)]))
+            self._add_filled(level, shard_index, shard_start, entry, nfilled)
+
+    def _write_shard(self, level, shard_start, buffer):
+        region = tuple(slice(start, start + size) for start, size in zip(shard_start, buffer.shape))
+        if self.shard_writer is not None:
+            self.shard_writer.submit(self.zarr_datas[level], region, buffer)
+        else:
+            self.zarr_datas[level][region] = buffer
+        if level + 1 < len(self.zarr_datas):
+            self._downsample_shard(level + 1, shard_start, buffer)
+
+    def _downsample_shard(self, level, source_start, source):
+        # A downsampled shard covers part of exactly one shard of the next level (shard sizes are multiples of
+        # downscale): downsample directly into that shard's buffer
+        factors = [self.downscale if dim in 'xy' else 1 for dim in self.dim_order]
+        offset = [start // factor for start, factor in zip(source_start, factors)]
+        out_shape = [-(-size // factor) for size, factor in zip(source.shape, factors)]
+        shard_index = tuple(start // shard for start, shard in zip(offset, self.zarr_datas[level].shards))
+        shard_start, shard_end = self._get_shard(level, shard_index)
+        if any(start + size > end for start, size, end in zip(offset, out_shape, shard_end)):
+            self.write_tile(level, offset, downsample(source, self.dim_order, self.downscale, self.method))
+            return
+        entry = self._get_pending(level, shard_index, shard_start, shard_end)
+        out_slices = tuple(slice(start - start1, start - start1 + size)
+                           for start, start1, size in zip(offset, shard_start, out_shape))
+        downsample(source, self.dim_order, self.downscale, self.method, out=entry[0][out_slices])
+        self._add_filled(level, shard_index, shard_start, entry, int(np.prod(out_shape)))
+
+
+def get_pyramid_shapes(shape, dim_order, nlevels, downscale=2):
+    shapes = [tuple(shape)]
+    for level in range(1, nlevels):
+        shapes.append(tuple(-(-size // downscale) if dim in 'xy' else size
+                            for dim, size in zip(dim_order, shapes[-1])))
+    return shapes
+
+
+def iter_shard_regions(level_shapes, shard_shape, dim_order, downscale=2):
+    # Yield level 0 shard regions grouped per shard of the lowest resolution level (depth-first),
+    # so every downsampled shard completes after its last child, keeping at most one pending shard per level
+    nshards = [[-(-size // shard) for size, shard in zip(level_shape, shard_shape)] for level_shape in level_shapes]
+
+    def expand(level, shard_index):
+        if level == 0:
+            yield tuple(slice(index * shard, min((index + 1) * shard, size))
+                        for index, shard, size in zip(shard_index, shard_shape, level_shapes[0]))
+            return
+        child_ranges = []
+        for dim, index, nshards1 in zip(dim_order, shard_index, nshards[level - 1]):
+            if dim in 'xy':
+                child_ranges.append(range(index * downscale, min((index + 1) * downscale, nshards1)))
+            else:
+                child_ranges.append(range(index, index + 1))
+        for child_index in itertools.product(*child_ranges):
+            yield from expand(level - 1, child_index)
+
+    top_level = len(level_shapes) - 1
+    for shard_index in np.ndindex(*nshards[top_level]):
+        yield from expand(top_level, shard_index)
+
+
+def downsample(tile, dim_order, downscale=2, method='mean', out=None):
+    """
+    Downsamples x and y by an integer factor using vectorized block reductions over strided views. Odd edges use
+    the available pixels (padded with edge values). The dtype is preserved; integer means are computed in integer
+    arithmetic.
+    """
+    factors = [downscale if dim in 'xy' else 1 for dim in dim_order]
+    if method == 'nearest':
+        result = tile[tuple(slice(None, None, factor) for factor in factors)]
+    else:
+        padding = [(0, -size % factor) for size, factor in zip(tile.shape, factors)]
+        if any(pad for _, pad in padding):
+            tile = np.pad(tile, padding, mode='edge')
+        # one strided view per position within the block
+        views = [tile[tuple(slice(start, None, factor) for start, factor in zip(starts, factors))]
+                 for starts in itertools.product(*[range(factor) for factor in factors])]
+        if method == 'mode':
+            result = block_mode(views)
+        else:
+            result = block_mean(views, tile.dtype)
+    if out is None:
+        return result.astype(tile.dtype, copy=False)
+    out[...] = result
+    return out
+
+
+def block_mean(views, dtype):
+    nblock = len(views)
+    if np.issubdtype(dtype, np.integer) and dtype.itemsize == 8:
+        # sums of 64-bit integers overflow: sum(v) = nblock * sum(v // nblock) + sum(v % nblock), both sums fit
+        quotient, remainder = np.divmod(views[0], nblock)
+        for view in views[1:]:
+            view_quotient, view_remainder = np.divmod(view, nblock)
+            quotient += view_quotient
+            remainder += view_remainder
+        # round half up
+        return quotient + (remainder + nblock // 2) // nblock
+    if np.issubdtype(dtype, np.inexact):
+        accumulator = np.promote_types(dtype, np.float32)
+    elif np.issubdtype(dtype, np.unsignedinteger) or dtype == bool:
+        accumulator = np.uint32 if dtype.itemsize <= 2 else np.uint64
+    else:
+        accumulator = np.int32 if dtype.itemsize <= 2 else np.int64
+    total = views[0].astype(accumulator)
+    for view in views[1:]:
+        np.add(total, view, out=total, casting='unsafe')
+    if np.issubdtype(dtype, np.inexact):
+        total *= 1 / nblock
+    else:
+        # round half up
+        total += nblock // 2
+        total //= nblock
+    return total
+
+
+def block_mode(views):
+    # Most frequent value per block; ties resolve to the first value in the block
+    best = views[0].copy()
+    # counts up to the block size (which may exceed 255)
+    best_count = np.zeros(best.shape, dtype=np.uint32)
+    for view in views:
+        count = np.zeros(best.shape, dtype=np.uint32)
+        for view1 in views:
+            count += view == view1
+        better = count > best_count
+        best[better] = view[better]
+        best_count[better] = count[better]
+    return best
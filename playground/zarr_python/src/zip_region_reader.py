@@ -0,0 +1,109 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from playground.zarr_python.src.zip_tile_cache import normalize_selection
+
+
+class RegionReader:
+    """
+    Batched reads of many regions from the pyramid levels of an image (e.g. patch sampling), filling preallocated
+    arrays. Requests are grouped per shard: the chunks a shard contributes to any of the requests are decoded once
+    (as their bounding box, or chunk by chunk when that box is mostly unused), in a thread pool, and copied into
+    every output they overlap.
+    """
+
+    def __init__(self, arrays, max_workers=None, max_unused_fraction=0.5):
+        # arrays: the arrays per level, e.g. as returned by zip_zarr_read
+        self.arrays = list(arrays)
+        self.max_unused_fraction = max_unused_fraction
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self, requests, out=None):
+        """
+        requests: sequence of (level, selection), with selections of integers and contiguous slices (as basic numpy
+        indexing). out: optional sequence of preallocated arrays, one per request, of the selected shape.
+        Returns the arrays with the selected data, in request order.
+        """
+        requests = list(requests)
+        if out is not None and len(out) != len(requests):
+            raise ValueError(f'Expected {len(requests)} output arrays, got {len(out)}')
+        outputs, squeezes = [], []
+        # (level, shard index) -> [chunk indices, [(output, region within the shard, requested slices)]]
+        shard_requests = {}
+        for request_index, (level, selection) in enumerate(requests):
+            array = self.arrays[level]
+            slices, squeeze_axes = normalize_selection(selection, array.shape)
+            shape = [slice1.stop - slice1.start for slice1 in slices]
+            squeezes.append(tuple(squeeze_axes))
+            if out is None:
+                outputs.append(np.empty(shape, dtype=array.dtype))
+            else:
+                output = out[request_index]
+                expected_shape = [size for axis, size in enumerate(shape) if axis not in squeeze_axes]
+                if list(output.shape) != expected_shape:
+                    raise ValueError(f'Output {request_index} has shape {output.shape}, expected {expected_shape}')
+                outputs.append(np.expand_dims(output, squeezes[-1]))
+            chunks = array.chunks
+            # unsharded for arrays without shards (e.g. other chunked array types)
+            shards = getattr(array, 'shards', None) or chunks
+            shard_ranges = [range(slice1.start // shard, -(-slice1.stop // shard))
+                            for slice1, shard in zip(slices, shards)]
+            for shard_index in itertools.product(*shard_ranges):
+                region = tuple(slice(max(slice1.start, index * shard), min(slice1.stop, (index + 1) * shard))
+                               for slice1, index, shard in zip(slices, shard_index, shards))
+                entry = shard_requests.setdefault((level, shard_index), [set(), []])
+                entry[0].update(itertools.product(*[range(slice1.start // chunk, -(-slice1.stop // chunk))
+                                                    for slice1, chunk in zip(region, chunks)]))
+                entry[1].append((outputs[request_index], region, slices))
+
+        futures = [self.executor.submit(self._read_shard, level, chunk_indices, items)
+                   for (level, _), (chunk_indices, items) in shard_requests.items()]
+        for future in futures:
+            future.result()
+        if out is not None:
+            return list(out)
+        return [output.squeeze(axis=squeeze) for output, squeeze in zip(outputs, squeezes)]
+
+    def _read_shard(self, level, chunk_indices, items):
+        array = self.arrays[level]
+        chunks = array.chunks
+        box_start = np.min(list(chunk_indices), axis=0)
+        box_stop = np.max(list(chunk_indices), axis=0) + 1
+        nbox_chunks = int(np.prod(box_stop - box_start))
+        if len(chunk_indices) >= nbox_chunks * (1 - self.max_unused_fraction):
+            boxes = [(box_start, box_stop)]
+        else:
+            boxes = [(np.array(chunk_index), np.array(chunk_index) + 1) for chunk_index in chunk_indices]
+        for box_start, box_stop in boxes:
+            box = tuple(slice(start * chunk, min(stop * chunk, size))
+                        for start, stop, chunk, size in zip(box_start, box_stop, chunks, array.shape))
+            data = None
+            for output, region, slices in items:
+                overlap = [(max(slice1.start, box1.start), min(slice1.stop, box1.stop))
+                           for slice1, box1 in zip(region, box)]
+                if any(start >= stop for start, stop in overlap):
+                    continue
+                if data is None:
+                    data = np.asarray(array[box])
+                output_slices = tuple(slice(start - slice1.start, stop - slice1.start)
+                                      for (start, stop), slice1 in zip(overlap, slices))
+                data_slices = tuple(slice(start - box1.start, stop - box1.start)
+                                    for (start, stop), box1 in zip(overlap, box))
+                output[output_slices] = data[data_slices]
+
+
+def read_regions(arrays, requests, out=None, max_workers=None):
+    """Reads many (level, selection) regions from the arrays per level at once (see RegionReader)."""
+    with RegionReader(arrays, max_workers=max_workers) as reader:
+        return reader.read(requests, out=out)
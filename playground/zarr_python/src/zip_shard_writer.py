@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import zarr
+from zarr.core.buffer import default_buffer_prototype
+from zarr.core.sync import sync
+from zarr.storage import MemoryStore
+
+
+_worker_local = threading.local()
+
+
+def encode_shard(path, metadata, region, data):
+    """
+    Encodes one shard region using the array's own codec pipeline (sharding + compression) into an in-memory
+    store, and returns the resulting (key, bytes) entries. Runs in worker threads or processes.
+    """
+    arrays = getattr(_worker_local, 'arrays', None)
+    if arrays is None:
+        arrays = _worker_local.arrays = {}
+    if (path, metadata) not in arrays:
+        store_dict = {}
+        store = MemoryStore(store_dict=store_dict)
+        sync(store.set(f'{path}/zarr.json', default_buffer_prototype().buffer.from_bytes(metadata)))
+        arrays[(path, metadata)] = zarr.open_array(store, path=path, mode='r+'), store_dict
+    array, store_dict = arrays[(path, metadata)]
+
+    array[region] = data
+    entries = []
+    for key in sorted(store_dict):
+        if not key.endswith('zarr.json'):
+            entries.append((key, store_dict.pop(key).to_bytes()))
+    return entries
+
+
+class StoreWriter:
+    """Writes entries to a zarr store, with the write(key, data) interface of StoredZipWriter."""
+
+    def __init__(self, store):
+        self.store = store
+        self.prototype = default_buffer_prototype()
+
+    def write(self, key, data):
+        sync(self.store.set(key, self.prototype.buffer.from_bytes(data)))
+
+
+def get_array_metadata(zarr_data):
+    return zarr_data.metadata.to_buffer_dict(default_buffer_prototype())['zarr.json'].to_bytes()
+
+
+class ParallelShardWriter:
+    """
+    Encodes shards in a thread or process pool, while a single writer thread appends the finished entries to the
+    store (a StoredZipWriter, or a zarr store wrapped in a StoreWriter) in submission order. As array metadata is
+    written before any data, this keeps the RFC-9 order (all zarr.json entries first). The number of shards in flight
+    is bounded by max_pending.
+    """
+
+    def __init__(self, store, max_workers=None, max_pending=None, use_processes=False):
+        self.store = store
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = 2 * max_workers
+        if use_processes:
+            # spawn: forking a process that runs zarr's event loop thread is unsafe
+            self.executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.slots = threading.Semaphore(max_pending)
+        self.futures = queue.Queue()
+        self.metadatas = {}
+        self.error = None
+        self.writer = threading.Thread(target=self._write_entries, daemon=True)
+        self.writer.start()
+
+    def submit(self, zarr_data, region, data):
+        self._check_error()
+        metadata = self.metadatas.get(zarr_data.path)
+        if metadata is None:
+            metadata = self.metadatas[zarr_data.path] = get_array_metadata(zarr_data)
+        self.slots.acquire()
+        self.futures.put(self.executor.submit(encode_shard, zarr_data.path, metadata, region, data))
+
+    def _write_entries(self):
+        while True:
+            future = self.futures.get()
+            if future is None:
+                break
+            try:
+                entries = future.result()
+                if self.error is None:
+                    for key, value in entries:
+                        self.store.write(key, value)
+            except BaseException as error:
+                if self.error is None:
+                    self.error = error
+            finally:
+                self.slots.release()
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.writer.is_alive():
+            self.futures.put(None)
+            self.writer.join()
+            self.executor.shutdown()
+        self._check_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
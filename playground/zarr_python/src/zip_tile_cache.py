@@ -0,0 +1,144 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TileCache:
+    """
+    Thread-safe LRU cache of decoded chunks, bounded by a total byte budget, with hit/miss/eviction statistics
+    per pyramid level.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.tiles = OrderedDict()
+        self.level_stats = {}
+        self.lock = threading.Lock()
+
+    def _get_level_stats(self, level):
+        if level not in self.level_stats:
+            self.level_stats[level] = {'hits': 0, 'misses': 0, 'evictions': 0}
+        return self.level_stats[level]
+
+    def get(self, key, level=None):
+        with self.lock:
+            entry = self.tiles.get(key)
+            stats = self._get_level_stats(level)
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            self.tiles.move_to_end(key)
+            stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, tile, level=None):
+        # the tile is cached by reference (not copied), as a read-only view: the caller's array stays writable
+        if tile.nbytes > self.max_bytes:
+            return
+        tile = tile.view()
+        tile.setflags(write=False)
+        with self.lock:
+            if key in self.tiles:
+                self.nbytes -= self.tiles.pop(key)[0].nbytes
+            self.tiles[key] = (tile, level)
+            self.nbytes += tile.nbytes
+            while self.nbytes > self.max_bytes:
+                _, (evicted, evicted_level) = self.tiles.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self._get_level_stats(evicted_level)['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.tiles.clear()
+            self.nbytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'ntiles': len(self.tiles),
+                'levels': {level: dict(stats) for level, stats in self.level_stats.items()},
+            }
+
+
+class CachedArray:
+    """
+    Read-only view of a zarr array that reads regions chunk by chunk, keeping decoded chunks in a TileCache.
+    Supports basic indexing (integers and contiguous slices).
+    """
+
+    def __init__(self, array, cache, level=None):
+        self.array = array
+        self.cache = cache
+        self.level = level if level is not None else array.path
+        self.key = str(array.store_path)
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.ndim = array.ndim
+        self.chunks = array.chunks
+        self.shards = array.shards
+
+    def __repr__(self):
+        return f'CachedArray({self.array!r})'
+
+    def __getitem__(self, selection):
+        slices, squeeze_axes = normalize_selection(selection, self.shape)
+        out = np.empty([slice1.stop - slice1.start for slice1 in slices], dtype=self.dtype)
+        chunk_ranges = [range(slice1.start // chunk, -(-slice1.stop // chunk))
+                        for slice1, chunk in zip(slices, self.chunks)]
+        for chunk_index in itertools.product(*chunk_ranges):
+            tile = self.get_chunk(chunk_index)
+            tile_slices, out_slices = [], []
+            for index, chunk, slice1 in zip(chunk_index, self.chunks, slices):
+                chunk_start = index * chunk
+                start = max(slice1.start, chunk_start)
+                stop = min(slice1.stop, chunk_start + chunk)
+                tile_slices.append(slice(start - chunk_start, stop - chunk_start))
+                out_slices.append(slice(start - slice1.start, stop - slice1.start))
+            out[tuple(out_slices)] = tile[tuple(tile_slices)]
+        if squeeze_axes:
+            out = out.squeeze(axis=tuple(squeeze_axes))
+        return out
+
+    def get_chunk(self, chunk_index):
+        key = (self.key, chunk_index)
+        tile = self.cache.get(key, self.level)
+        if tile is None:
+            region = tuple(slice(index * chunk, min((index + 1) * chunk, size))
+                           for index, chunk, size in zip(chunk_index, self.chunks, self.shape))
+            tile = np.asarray(self.array[region])
+            self.cache.put(key, tile, self.level)
+        return tile
+
+
+def normalize_selection(selection, shape):
+    # Returns a slice per dimension (start/stop within bounds), and axes to squeeze for integer indices
+    if not isinstance(selection, tuple):
+        selection = (selection,)
+    if Ellipsis in selection:
+        position = selection.index(Ellipsis)
+        nfill = len(shape) - len(selection) + 1
+        selection = selection[:position] + (slice(None),) * nfill + selection[position + 1:]
+    if len(selection) > len(shape):
+        raise IndexError(f'too many indices for array with {len(shape)} dimensions')
+    selection = selection + (slice(None),) * (len(shape) - len(selection))
+    slices, squeeze_axes = [], []
+    for axis, (item, size) in enumerate(zip(selection, shape)):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(size)
+            if step != 1:
+                raise IndexError('only contiguous slices are supported')
+            slices.append(slice(start, max(start, stop)))
+        else:
+            index = int(item)
+            if index < 0:
+                index += size
+            if not 0 <= index < size:
+                raise IndexError(f'index {item} out of bounds for axis {axis} with size {size}')
+            slices.append(slice(index, index + 1))
+            squeeze_axes.append(axis)
+    return slices, squeeze_axes
@@ -0,0 +1,209 @@
+import os
+import struct
+import time
+import zlib
+
+from playground.zarr_python.src.zip_index import (CENTRAL_DIRECTORY_SIGNATURE, CENTRAL_DIRECTORY_STRUCT,
+                                                  END_RECORD64_LOCATOR_SIGNATURE, END_RECORD64_LOCATOR_STRUCT,
+                                                  END_RECORD64_SIGNATURE, END_RECORD64_STRUCT, END_RECORD_SIGNATURE,
+                                                  END_RECORD_STRUCT, LOCAL_HEADER_SIGNATURE, LOCAL_HEADER_STRUCT,
+                                                  MAX_UINT32, UTF8_FLAG, ZIP64_EXTRA_ID, ZipIndex, read_end_record)
+
+
+ZIP64_VERSION = 45
+UNIX_SYSTEM = 3
+COPY_BUFFER_SIZE = 16 * 1024 * 1024
+# position of the CRC-32 in a local file header
+LOCAL_HEADER_CRC_OFFSET = 14
+
+
+class StoredZipWriter:
+    """
+    Minimal sequential writer of uncompressed (ZIP_STORED) ZIP64 archives. Entries are written in the order added,
+    each with its size and CRC-32 known up front (no data descriptors), and the central directory, ZIP64 end
+    records and comment are written once on close.
+
+    mode 'a' appends to an existing uncompressed archive: new entries are written after its end records, and an
+    entry written with an existing name replaces that entry in the new central directory, leaving the previous data
+    unreferenced (see zip_pack.compact_zip). The existing central directory is left intact until the new one is
+    written on close: a failed append restores the original archive, and an interrupted one (e.g. a killed process)
+    can be restored with zip_pack.recover_zip.
+    """
+
+    def __init__(self, filename, mode='w'):
+        if mode not in ('w', 'a'):
+            raise ValueError(f'Unsupported mode {mode}, expected "w" or "a"')
+        self.filename = filename
+        # encoded name -> header offset, size, crc (in central directory order)
+        self.entries = {}
+        # names written by this writer
+        self.names = set()
+        self.comment = b''
+        # size of the archive appended to, restored if appending fails
+        self.original_size = None
+        if mode == 'a':
+            self.file = open(filename, 'r+b')
+            try:
+                self._read_entries()
+            except BaseException:
+                self.file.close()
+                raise
+        else:
+            self.file = open(filename, 'wb')
+        now = time.localtime()
+        self.dos_time = (now.tm_hour << 11) | (now.tm_min << 5) | (now.tm_sec // 2)
+        self.dos_date = ((now.tm_year - 1980) << 9) | (now.tm_mon << 5) | now.tm_mday
+
+    def _read_entries(self):
+        end_record = read_end_record(self.file, self.filename)
+        if end_record.concat:
+            raise ValueError(f'Cannot append to a zip file with data preceding the archive: {self.filename}')
+        index = ZipIndex.from_fileobj(self.file, self.filename)
+        if index.compress_types.any():
+            raise ValueError(f'Cannot append to a zip file with compressed entries: {self.filename}')
+        for name, header_offset, size, crc in zip(index.names, index.header_offsets.tolist(), index.sizes.tolist(),
+                                                  index.crcs.tolist()):
+            self.entries[name.encode('utf-8')] = (header_offset, size, crc)
+        self.comment = index.comment
+        self.original_size = self.file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.original_size is not None:
+            # remove the new entries: the archive appended to is unchanged
+            self.file.truncate(self.original_size)
+            self.file.close()
+        else:
+            self.file.close()
+
+    def _write_local_header(self, name, size, crc):
+        if name in self.names:
+            raise ValueError(f'Duplicate zip entry {name}')
+        self.names.add(name)
+        encoded_name = name.encode('utf-8')
+        # sizes are always stored in the ZIP64 extra field
+        extra = struct.pack('<2H2Q', ZIP64_EXTRA_ID, 16, size, size)
+        self.entries[encoded_name] = (self.file.tell(), size, crc)
+        self.file.write(LOCAL_HEADER_STRUCT.pack(
+            LOCAL_HEADER_SIGNATURE, ZIP64_VERSION, 0, UTF8_FLAG, 0, self.dos_time, self.dos_date, crc,
+            MAX_UINT32, MAX_UINT32, len(encoded_name), len(extra)))
+        self.file.write(encoded_name)
+        self.file.write(extra)
+
+    def write(self, name, data, crc=None):
+        data = memoryview(data).cast('B')
+        if crc is None:
+            crc = zlib.crc32(data)
+        self._write_local_header(name, len(data), crc)
+        self.file.write(data)
+
+    def write_file(self, name, source_filename, size=None, crc=None, offset=0):
+        # copies size bytes from offset of source_filename (by default the whole file)
+        if size is None:
+            size = os.path.getsize(source_filename) - offset
+        if crc is not None:
+            self._write_local_header(name, size, crc)
+            copy_file(source_filename, self.file, size, offset)
+            return
+        # unknown CRC: computed while copying (a single read of the source), then patched into the local header
+        header_offset = self.file.tell()
+        self._write_local_header(name, size, 0)
+        crc = copy_file_crc(source_filename, self.file, size, offset)
+        self.file.seek(header_offset + LOCAL_HEADER_CRC_OFFSET)
+        self.file.write(struct.pack('<L', crc))
+        self.file.seek(0, os.SEEK_END)
+        self.entries[name.encode('utf-8')] = (header_offset, size, crc)
+
+    def close(self, comment=None):
+        # comment: archive comment; by default the comment of the archive appended to (if any)
+        if self.file.closed:
+            return
+        if comment is None:
+            comment = self.comment
+        cd_offset = self.file.tell()
+        for encoded_name, (header_offset, size, crc) in self.entries.items():
+            extra = struct.pack('<2H3Q', ZIP64_EXTRA_ID, 24, size, size, header_offset)
+            self.file.write(CENTRAL_DIRECTORY_STRUCT.pack(
+                CENTRAL_DIRECTORY_SIGNATURE, ZIP64_VERSION, UNIX_SYSTEM, ZIP64_VERSION, 0, UTF8_FLAG, 0,
+                self.dos_time, self.dos_date, crc, MAX_UINT32, MAX_UINT32, len(encoded_name), len(extra), 0, 0, 0,
+                0o100644 << 16, MAX_UINT32))
+            self.file.write(encoded_name)
+            self.file.write(extra)
+        end_offset = self.file.tell()
+        cd_size = end_offset - cd_offset
+        nentries = len(self.entries)
+        self.file.write(END_RECORD64_STRUCT.pack(
+            END_RECORD64_SIGNATURE, END_RECORD64_STRUCT.size - 12, ZIP64_VERSION, ZIP64_VERSION, 0, 0,
+            nentries, nentries, cd_size, cd_offset))
+        self.file.write(END_RECORD64_LOCATOR_STRUCT.pack(END_RECORD64_LOCATOR_SIGNATURE, 0, end_offset, 1))
+        self.file.write(END_RECORD_STRUCT.pack(
+            END_RECORD_SIGNATURE, 0, 0, min(nentries, 0xFFFF), min(nentries, 0xFFFF), min(cd_size, MAX_UINT32),
+            min(cd_offset, MAX_UINT32), len(comment)))
+        self.file.write(comment)
+        self.file.close()
+
+
+def sort_breadth_first(names):
+    # RFC-9 order of metadata entries: the root first, then by depth in the hierarchy
+    return sorted(names, key=lambda name: (name.count('/'), name))
+
+
+def copy_file_crc(source_filename, destination, size, offset=0, buffer_size=COPY_BUFFER_SIZE):
+    # Appends size bytes of a file (from offset) to an open destination file with buffered copies, and returns
+    # their CRC-32, computed in the same pass
+    crc = 0
+    with open(source_filename, 'rb', buffering=0) as source:
+        source.seek(offset)
+        buffer = bytearray(min(buffer_size, max(size, 1)))
+        view = memoryview(buffer)
+        remaining = size
+        while remaining > 0:
+            nread = source.readinto(view[:min(remaining, len(buffer))])
+            if not nread:
+                raise EOFError(f'Unexpected end of file {source_filename}')
+            crc = zlib.crc32(view[:nread], crc)
+            destination.write(view[:nread])
+            remaining -= nread
+    return crc
+
+
+def copy_file(source_filename, destination, size, offset=0):
+    """
+    Appends size bytes of a file (from offset) to an open destination file, in the kernel where possible
+    (copy_file_range, then sendfile), else with large buffered copies.
+    """
+    destination.flush()
+    with open(source_filename, 'rb') as source:
+        copied = 0
+        for copy_function in [getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)]:
+            if copy_function is None:
+                continue
+            try:
+                while copied < size:
+                    if copy_function is os.sendfile:
+                        ncopied = os.sendfile(destination.fileno(), source.fileno(), offset + copied, size - copied)
+                    else:
+                        ncopied = os.copy_file_range(source.fileno(), destination.fileno(), size - copied,
+                                                     offset + copied)
+                    if ncopied == 0:
+                        break
+                    copied += ncopied
+                if copied >= size:
+                    # the kernel advanced the file position: resync the buffered file object
+                    destination.seek(0, os.SEEK_END)
+                    return
+            except OSError:
+                if copied:
+                    raise
+        source.seek(offset + copied)
+        remaining = size - copied
+        while remaining > 0:
+            data = source.read(min(remaining, COPY_BUFFER_SIZE))
+            if not data:
+                raise EOFError(f'Unexpected end of file {source_filename}')
+            destination.write(data)
+            remaining -= len(data)
@@ -1,139 +1,146 @@
-import json
-import numpy as np
-from ome_zarr.scale import Scaler
-import zarr
-from ome_zarr_models.v05 import Image
-from ome_zarr_models.v05.axes import Axis
-from pydantic_zarr.v3 import ArraySpec
-from zarr.storage import ZipStore
-from zipfile import ZipFile
-
+# Read path: only depends on zarr and numpy. Writing (and the OME-Zarr model dependencies) is in zip_zarr_writer.
+import os
+import time
 
-def zip_zarr_read(uri):
-    store = ZipStore(uri)
-    root = zarr.open(store, mode='r')
+import zarr
+from zarr.core.array import AsyncArray
+from zarr.core.group import AsyncGroup, GroupMetadata
+from zarr.core.sync import sync
+from zarr.storage import StorePath, WrapperStore
+
+from playground.zarr_python.src.ozx_store import AsyncOzxStore, OzxStore
+from playground.zarr_python.src.zip_index import read_metadata_documents
+from playground.zarr_python.src.zip_instrumentation import InstrumentedStore
+from playground.zarr_python.src.zip_tile_cache import CachedArray
+
+
+METADATA_FILENAME = 'zarr.json'
+# names moved to zip_zarr_writer, still importable from here (loaded on first access, keeping this import fast)
+WRITER_NAMES = ['zip_zarr_write', 'zip_zarr_write_streaming', 'zip_zarr_append', 'create_image_attributes',
+                'create_axes_metadata', 'create_transformation_metadata']
+
+
+def __getattr__(name):
+    if name in WRITER_NAMES:
+        from playground.zarr_python.src import zip_zarr_writer
+        return getattr(zip_zarr_writer, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def zip_zarr_read(uri, index=None, cache=None, concurrent=False, stats=None, levels=None, labels=None):
+    # uri: local path (str or path-like) or http(s) url
+    uri = os.fspath(uri)
+    if uri.startswith(('http://', 'https://')):
+        # Remote archive, read with HTTP range requests (http.client is only imported for remote archives)
+        from playground.zarr_python.src.http_ozx_store import HttpOzxStore
+        store = HttpOzxStore(uri, index=index)
+    elif concurrent:
+        # Fetch chunks with concurrent positional reads
+        store = AsyncOzxStore(uri, index=index)
+    else:
+        store = OzxStore(uri, index=index)
+    if stats is not None:
+        # Record per-operation counts, bytes and latencies of the zip store in stats (StoreStats)
+        store = InstrumentedStore(store, stats)
+    # All zarr.json entries are parsed in one read, and the hierarchy is opened from these documents
+    documents = get_metadata_documents(store)
+    if '' not in documents:
+        raise FileNotFoundError(f'No root zarr.json found in {uri}')
+    root = zarr.Group(AsyncGroup(metadata=GroupMetadata.from_dict(documents['']), store_path=StorePath(store)))
     metadata = root.metadata.to_dict()['attributes']['ome']
-    data = get_zarr_data(root)
+    data = get_zarr_data(root, levels=levels, labels=labels, documents=documents)
+    if cache is not None:
+        # Serve repeated reads of the same tiles from the (shared) decoded tile cache
+        data = [CachedArray(array, cache) for array in data]
     return metadata, data
 
 
-def get_zarr_data(group):
-    data = []
-    for level, node in enumerate(group):
-        node = group.get(node)
+def get_zarr_data(group, levels=None, labels=None, path_filter=None, documents=None):
+    return list(iter_zarr_data(group, levels=levels, labels=labels, path_filter=path_filter, documents=documents))
+
+
+def iter_zarr_data(group, levels=None, labels=None, path_filter=None, documents=None):
+    """
+    Lazily yields the arrays in a group hierarchy, breadth-first (pyramid levels in multiscales order).
+    For zip stores, all zarr.json entries are parsed in one read, and arrays are opened from these documents
+    without reading any metadata per node.
+
+    levels: multiscales level indices to include (e.g. [0] for full resolution only); arrays that are not part of a
+    multiscales image are only included when levels is None.
+    labels: True for label images only, False to exclude label images, None for both.
+    path_filter: optional callable(path) -> bool on the array path.
+    documents: previously read get_metadata_documents() of the store.
+    """
+    store = group.store_path.store
+    if documents is None:
+        documents = get_metadata_documents(store)
+    if documents is None:
+        yield from iter_group_arrays(group, levels, labels, path_filter)
+        return
+    if group.path:
+        prefix = group.path + '/'
+        documents = {path[len(prefix):] if path != group.path else '': document
+                     for path, document in documents.items() if path == group.path or path.startswith(prefix)}
+    arrays = []
+    for path, document in documents.items():
+        if document.get('node_type') != 'array':
+            continue
+        parent, _, name = path.rpartition('/')
+        level = get_multiscales_level(documents.get(parent, {}), name)
+        arrays.append(((path.count('/'), parent, level if level is not None else float('inf'), name), path, level))
+    for _, path, level in sorted(arrays):
+        if not include_array(path, level, levels, labels, path_filter):
+            continue
+        full_path = f'{group.path}/{path}' if group.path else path
+        yield zarr.Array(AsyncArray(metadata=documents[path], store_path=StorePath(store, full_path)))
+
+
+def get_metadata_documents(store):
+    # Node path -> zarr.json document, from a single read of a zip store, or None for other stores
+    zip_store = store._store if isinstance(store, WrapperStore) else store
+    if not isinstance(zip_store, OzxStore):
+        return None
+    if not zip_store._is_open:
+        sync(store._ensure_open())
+    start = time.perf_counter()
+    documents = read_metadata_documents(zip_store.get_file(), zip_store.index)
+    if isinstance(store, InstrumentedStore):
+        index = zip_store.index
+        nbytes = sum(int(index.sizes[index1]) for path in documents
+                     if (index1 := index.lookup.get(f'{path}/zarr.json' if path else 'zarr.json')) is not None)
+        store.stats.record('metadata_load', nbytes, time.perf_counter() - start)
+    return documents
+
+
+def iter_group_arrays(group, levels=None, labels=None, path_filter=None, path=''):
+    # Generic (per node) traversal for stores without a zip index
+    groups = []
+    for name, node in sorted(group.members(), key=lambda member: member[0]):
+        node_path = f'{path}/{name}' if path else name
         if isinstance(node, zarr.Group):
-            data.extend(get_zarr_data(node))
-        else:
-            data.append(node)
-    return data
-
-
-def zip_zarr_write(uri, data, dim_order, pixel_size_um):
-    pyramid_datas = []
-    zarr_datas = []
-    store = ZipStore(uri, mode='w')
-    scaler = Scaler()
-    downscale = scaler.downscale
-
-    scales, transforms = [], []
-    paths = []
-    scale = 1
-    for level in range(1 + scaler.max_layer):
-        if level > 0:
-            data = scaler.resize_image(data)
-        pyramid_datas.append(data)
-        paths.append(str(level))
-        scales1, transforms1 = create_transformation_metadata(dim_order, pixel_size_um, scale)
-        scales.append(scales1)
-        transforms.append(transforms1)
-        scale /= downscale
-
-    array_specs = [ArraySpec.from_array(data, dimension_names=list(dim_order)) for data in pyramid_datas]
-
-    ome_zarr_image = Image.new(
-        array_specs=array_specs,
-        paths=paths,
-        axes=create_axes_metadata(dim_order),
-        scales=scales,
-        translations=transforms,
-    )
-
-    ome_zarr_attributes = ome_zarr_image.model_dump()['attributes']
-
-    # Avoid re-creating root metdata, by providing all metadata in creation of root group
-    root = zarr.create_group(store, attributes=ome_zarr_attributes)
-
-    for level in range(1 + scaler.max_layer):
-        # Using write_data=False only writes metadata; store zarr array & pyramid data for later
-        zarr_data = root.create_array(name=str(level), dimension_names=list(dim_order),
-                                      data=data, chunks=(10, 10), shards=(10, 10), write_data=False)
-        zarr_datas.append(zarr_data)
-
-    # Now write pyramid data into zarr arrays
-    for zarr_data, pyramid_data in zip(zarr_datas, pyramid_datas):
-        zarr_data[:] = pyramid_data
-
-    store.close()
-
-    with ZipFile(uri, 'a') as zipfile1:
-        zipfile1.comment = json.dumps({'ome': {'version': ome_zarr_attributes['ome']['version']}}).encode('utf-8')
-
-
-def create_axes_metadata(dim_order):
-    axes = []
-    for dim in dim_order:
-        unit1 = None
-        if dim == 't':
-            type1 = 'time'
-            unit1 = 'millisecond'
-        elif dim == 'c':
-            type1 = 'channel'
-        else:
-            type1 = 'space'
-            unit1 = 'micrometer'
-        if unit1 is not None and unit1 != '':
-            axis = Axis(name=dim, type=type1, unit=unit1)
-        else:
-            axis = Axis(name=dim, type=type1)
-        axes.append(axis)
-    return axes
-
-
-def create_transformation_metadata(dim_order, pixel_size_um, scale, translation_um={}):
-    scales = []
-    translations = []
-    for dim in dim_order:
-        if dim in pixel_size_um:
-            pixel_size_scale1 = pixel_size_um[dim]
+            groups.append((node, node_path))
         else:
-            pixel_size_scale1 = 1
-        if dim in 'xy':
-            pixel_size_scale1 /= scale
-        scales.append(pixel_size_scale1)
-
-        if dim in translation_um:
-            translation1 = translation_um[dim]
-        else:
-            translation1 = 0
-        if dim in 'xy':
-            pixel_size_scale1 *= scale
-        translations.append(translation1)
-
-    return scales, translations
-
-
-if __name__ == "__main__":
-    #filename = 'C:/Project/slides/6001240.zarr'
-    #filename = 'C:/Project/slides/ozx/6001240.ozx'
-    #filename = 'C:/Project/slides/ozx/kingsnake.ozx'
-    #result = zip_zarr_read(filename)
-    #print(result)
-
-    filename = 'C:/Project/slides/ozx/test.ozx'
-    data = np.random.rand(100, 100)
-    dim_order = 'yx'
-    pixel_size = {'x': 1, 'y': 1}
-    zip_zarr_write(filename, data, dim_order, pixel_size)
-
-    result = zip_zarr_read(filename)
-    print(result)
+            level = get_multiscales_level({'attributes': group.attrs.asdict()}, name)
+            if include_array(node_path, level, levels, labels, path_filter):
+                yield node
+    for node, node_path in groups:
+        yield from iter_group_arrays(node, levels, labels, path_filter, node_path)
+
+
+def get_multiscales_level(group_document, name):
+    attributes = group_document.get('attributes', {})
+    # OME-Zarr 0.5 nests the metadata under 'ome', 0.4 uses the attributes directly
+    multiscales = attributes.get('ome', attributes).get('multiscales', [])
+    for multiscale in multiscales:
+        dataset_paths = [dataset.get('path') for dataset in multiscale.get('datasets', [])]
+        if name in dataset_paths:
+            return dataset_paths.index(name)
+    return None
+
+
+def include_array(path, level, levels=None, labels=None, path_filter=None):
+    if levels is not None and level not in levels:
+        return False
+    if labels is not None and ('labels' in path.split('/')[:-1]) != labels:
+        return False
+    return path_filter is None or path_filter(path)
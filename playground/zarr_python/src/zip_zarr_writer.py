@@ -0,0 +1,281 @@
+import json
+import os
+import warnings
+
+import numpy as np
+import zarr
+from ome_zarr_models.v05 import Image
+from ome_zarr_models.v05.axes import Axis
+from pydantic_zarr.v3 import ArraySpec
+from zarr.core.array import AsyncArray
+from zarr.core.sync import sync
+from zarr.errors import ZarrUserWarning
+from zarr.storage import MemoryStore, StorePath
+
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_chunking import (TARGET_CHUNK_BYTES, TARGET_SHARD_BYTES, get_chunk_shape,
+                                                     get_level_chunks, get_shard_shape)
+from playground.zarr_python.src.zip_index import ZipIndex, read_metadata_documents, read_metadata_entries
+from playground.zarr_python.src.zip_pyramid import PyramidBuilder, get_pyramid_shapes, iter_shard_regions
+from playground.zarr_python.src.zip_shard_writer import ParallelShardWriter, get_array_metadata
+from playground.zarr_python.src.zip_writer import StoredZipWriter, sort_breadth_first
+
+
+METADATA_FILENAME = 'zarr.json'
+
+
+def zip_zarr_write(uri, data, dim_order, pixel_size_um, method='mean', chunks=None, shards=None, max_workers=None,
+                   use_processes=False, consolidated=False):
+    # All pyramid levels are built in a single pass over the data (see zip_zarr_write_streaming)
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size_um, chunks=chunks, shards=shards,
+                             method=method, max_workers=max_workers, use_processes=use_processes,
+                             consolidated=consolidated)
+
+
+def zip_zarr_write_streaming(uri, source, dim_order, pixel_size_um, shape=None, dtype=None,
+                             chunks=None, shards=None, nlevels=5, downscale=2, method='mean', max_pending_shards=16,
+                             max_workers=None, use_processes=False, target_chunk_bytes=TARGET_CHUNK_BYTES,
+                             target_shard_bytes=TARGET_SHARD_BYTES, consolidated=False):
+    """
+    Writes a pyramid without holding any full level in memory.
+
+    source can be an array-like supporting slicing (numpy memmap, dask or zarr array), or an iterable of
+    (offset, tile) pairs, in which case shape and dtype must be provided. Downsampled levels are computed
+    shard by shard from the level above, and each shard is encoded and written to the zip as soon as it is complete.
+    method selects the downsampling: 'mean' (intensity images), 'mode' (label images) or 'nearest'.
+    chunks and shards (level 0) are derived from the dtype and target_chunk_bytes / target_shard_bytes unless
+    given, and are clipped to the shape of each level.
+    consolidated: also store the metadata of the whole hierarchy in the root zarr.json (zarr consolidated metadata),
+    so readers can open the archive from a single entry.
+    """
+    is_array = hasattr(source, 'shape') and hasattr(source, '__getitem__')
+    if is_array:
+        shape, dtype = source.shape, source.dtype
+    elif shape is None or dtype is None:
+        raise ValueError('shape and dtype are required for a tile iterator source')
+    shape = tuple(shape)
+    dtype = np.dtype(dtype)
+    if chunks is None:
+        chunks = get_chunk_shape(shape, dtype, dim_order, target_chunk_bytes)
+    if shards is None:
+        shards = get_shard_shape(shape, dtype, dim_order, chunks, target_shard_bytes)
+
+    level_shapes = get_pyramid_shapes(shape, dim_order, nlevels, downscale)
+    for dim, shard, size in zip(dim_order, shards, shape):
+        if dim in 'xy' and shard < size and shard % downscale:
+            raise ValueError(f'Shard size {shard} along {dim} must be divisible by downscale {downscale}')
+
+    # Shape/dtype-only placeholders; no pixel data is allocated for metadata creation
+    placeholders = [np.broadcast_to(np.zeros((), dtype=dtype), level_shape) for level_shape in level_shapes]
+    ome_zarr_attributes = create_image_attributes(placeholders, dim_order, pixel_size_um, downscale)
+
+    # Plan the full hierarchy in memory (metadata only), so the zip is written in one pass: all zarr.json entries
+    # first, then the data entries as shards complete, then the central directory and comment
+    metadata_dict = {}
+    root = zarr.create_group(MemoryStore(store_dict=metadata_dict), attributes=ome_zarr_attributes)
+    zarr_datas = []
+    level_chunks = get_level_chunks(level_shapes, chunks, shards)
+    for level, (level_shape, (chunks1, shards1)) in enumerate(zip(level_shapes, level_chunks)):
+        zarr_data = root.create_array(name=str(level), shape=level_shape, dtype=dtype, dimension_names=list(dim_order),
+                                      chunks=chunks1, shards=shards1)
+        zarr_datas.append(zarr_data)
+    if consolidated:
+        with warnings.catch_warnings():
+            # zarr warns consolidated metadata is not (yet) part of the zarr v3 specification
+            warnings.simplefilter('ignore', ZarrUserWarning)
+            zarr.consolidate_metadata(root.store)
+
+    # Written to a temporary file, moved to uri when complete: a failed write leaves no partial archive behind
+    temp_uri = uri + '.tmp'
+    try:
+        with StoredZipWriter(temp_uri) as zip_writer:
+            for key in sort_breadth_first(metadata_dict):
+                zip_writer.write(key, metadata_dict[key].to_bytes())
+            with ParallelShardWriter(zip_writer, max_workers=max_workers, use_processes=use_processes) as shard_writer:
+                writer = PyramidBuilder(zarr_datas, dim_order, downscale, method, max_pending_shards, shard_writer)
+                if is_array:
+                    for region in iter_shard_regions(level_shapes, shards, dim_order, downscale):
+                        writer.write_tile(0, tuple(slice1.start for slice1 in region), np.asarray(source[region]))
+                else:
+                    for offset, tile in source:
+                        writer.write_tile(0, tuple(offset), np.asarray(tile, dtype=dtype))
+                if writer.npending > 0:
+                    raise ValueError(f'Source did not cover the full image, {writer.npending} shard(s) incomplete')
+            zip_writer.close(json.dumps({'ome': {'version': ome_zarr_attributes['ome']['version']}}).encode('utf-8'))
+        os.replace(temp_uri, uri)
+    except BaseException:
+        if os.path.exists(temp_uri):
+            os.remove(temp_uri)
+        raise
+
+
+def zip_zarr_append(uri, source, dim, method='mean', max_pending_shards=16, max_workers=None, use_processes=False,
+                    multiscale=0):
+    """
+    Appends data along a non-spatial dimension (new time points, channels or z planes) to the image of an existing
+    .ozx, in time proportional to the new data: the shape of each pyramid level is extended, and the new shards are
+    written after the existing entries, followed by a new central directory. A partially filled shard along dim is
+    read back and rewritten; its previous entry remains as unreferenced data, and the updated zarr.json entries
+    follow the data, until the archive is compacted into RFC-9 order (zip_pack.compact_zip).
+
+    source: array-like with the shape and dtype of the image, except along dim.
+    multiscale: index of the multiscales entry (of the root image) to append to.
+    """
+    index = ZipIndex.from_file(uri)
+    documents = read_metadata_documents(uri, index)
+    if '' not in documents:
+        raise FileNotFoundError(f'No root zarr.json found in {uri}')
+    multiscales = documents['']['attributes']['ome']['multiscales']
+    if not 0 <= multiscale < len(multiscales):
+        raise ValueError(f'Multiscale {multiscale} not found, the image has {len(multiscales)} multiscales')
+    multiscale = multiscales[multiscale]
+    paths = [dataset['path'] for dataset in multiscale['datasets']]
+    dim_order = ''.join(axis['name'] for axis in multiscale['axes'])
+    if dim not in dim_order or dim in 'xy':
+        raise ValueError(f'Can only append along a non-spatial dimension of {dim_order}, not {dim}')
+    axis = dim_order.index(dim)
+
+    store = OzxStore(uri, index=index)
+    sync(store._ensure_open())
+    old_datas = [zarr.Array(AsyncArray(metadata=documents[path], store_path=StorePath(store, path)))
+                 for path in paths]
+    old_size = old_datas[0].shape[axis]
+    shape = list(old_datas[0].shape)
+    shape[axis] = source.shape[axis]
+    if tuple(source.shape) != tuple(shape) or np.dtype(source.dtype) != old_datas[0].dtype:
+        raise ValueError(f'Expected data of shape {tuple(shape)} (any size along {dim}) and dtype '
+                         f'{old_datas[0].dtype}, got {source.shape} {source.dtype}')
+    new_size = old_size + source.shape[axis]
+
+    # Rewrite from the start of the last (partially filled) shard along dim, in all levels
+    start = old_size - old_size % int(np.lcm.reduce([old_data.shards[axis] for old_data in old_datas]))
+
+    zarr_datas = []
+    for path, old_data in zip(paths, old_datas):
+        level_shape = list(old_data.shape)
+        level_shape[axis] = new_size
+        metadata = old_data.metadata.update_shape(tuple(level_shape))
+        zarr_datas.append(zarr.Array(AsyncArray(metadata=metadata, store_path=StorePath(MemoryStore(), path))))
+    # level 0 regions of the rewritten part, in the shard grid of the full image (start is shard aligned)
+    slab_shapes = [data.shape[:axis] + (new_size - start,) + data.shape[axis + 1:] for data in zarr_datas]
+    transforms = [transform for dataset in multiscale['datasets'][:2]
+                  for transform in dataset['coordinateTransformations'] if transform['type'] == 'scale']
+    x_axis = dim_order.index('x')
+    downscale = round(transforms[1]['scale'][x_axis] / transforms[0]['scale'][x_axis]) if len(transforms) > 1 else 2
+
+    def get_tile(region):
+        # existing data of the rewritten part is read back per shard region (from the original entries)
+        tile_start, tile_end = region[axis].start, region[axis].stop
+        parts = []
+        if tile_start < old_size:
+            parts.append(old_datas[0][region[:axis] + (slice(tile_start, min(tile_end, old_size)),)
+                                      + region[axis + 1:]])
+        if tile_end > old_size:
+            parts.append(np.asarray(source[region[:axis] + (slice(max(tile_start, old_size) - old_size,
+                                                                  tile_end - old_size),) + region[axis + 1:]]))
+        return np.concatenate(parts, axis=axis) if len(parts) > 1 else parts[0]
+
+    # the original entries are not modified by appending: the store reads them while the new entries are written
+    with store, StoredZipWriter(uri, mode='a') as zip_writer:
+        root_document = read_metadata_entries(uri, index, root_only=True)['']
+        if 'consolidated_metadata' in root_document:
+            for path, zarr_data in zip(paths, zarr_datas):
+                root_document['consolidated_metadata']['metadata'][path]['shape'] = list(zarr_data.shape)
+            zip_writer.write(METADATA_FILENAME, json.dumps(root_document, indent=2).encode('utf-8'))
+        for path, zarr_data in zip(paths, zarr_datas):
+            zip_writer.write(f'{path}/{METADATA_FILENAME}', get_array_metadata(zarr_data))
+
+        with ParallelShardWriter(zip_writer, max_workers=max_workers, use_processes=use_processes) as shard_writer:
+            writer = PyramidBuilder(zarr_datas, dim_order, downscale, method, max_pending_shards, shard_writer)
+            for region in iter_shard_regions(slab_shapes, zarr_datas[0].shards, dim_order, downscale):
+                region = region[:axis] + (slice(region[axis].start + start, region[axis].stop + start),) \
+                    + region[axis + 1:]
+                writer.write_tile(0, tuple(slice1.start for slice1 in region), get_tile(region))
+            if writer.npending > 0:
+                raise ValueError(f'{writer.npending} shard(s) incomplete')
+
+
+def create_image_attributes(pyramid_datas, dim_order, pixel_size_um, downscale):
+    scales, transforms = [], []
+    paths = []
+    scale = 1
+    for level in range(len(pyramid_datas)):
+        paths.append(str(level))
+        scales1, transforms1 = create_transformation_metadata(dim_order, pixel_size_um, scale)
+        scales.append(scales1)
+        transforms.append(transforms1)
+        scale /= downscale
+
+    array_specs = [ArraySpec.from_array(data, dimension_names=list(dim_order)) for data in pyramid_datas]
+
+    ome_zarr_image = Image.new(
+        array_specs=array_specs,
+        paths=paths,
+        axes=create_axes_metadata(dim_order),
+        scales=scales,
+        translations=transforms,
+    )
+
+    return ome_zarr_image.model_dump()['attributes']
+
+
+def create_axes_metadata(dim_order):
+    axes = []
+    for dim in dim_order:
+        unit1 = None
+        if dim == 't':
+            type1 = 'time'
+            unit1 = 'millisecond'
+        elif dim == 'c':
+            type1 = 'channel'
+        else:
+            type1 = 'space'
+            unit1 = 'micrometer'
+        if unit1 is not None and unit1 != '':
+            axis = Axis(name=dim, type=type1, unit=unit1)
+        else:
+            axis = Axis(name=dim, type=type1)
+        axes.append(axis)
+    return axes
+
+
+def create_transformation_metadata(dim_order, pixel_size_um, scale, translation_um={}):
+    scales = []
+    translations = []
+    for dim in dim_order:
+        if dim in pixel_size_um:
+            pixel_size_scale1 = pixel_size_um[dim]
+        else:
+            pixel_size_scale1 = 1
+        if dim in 'xy':
+            pixel_size_scale1 /= scale
+        scales.append(pixel_size_scale1)
+
+        if dim in translation_um:
+            translation1 = translation_um[dim]
+        else:
+            translation1 = 0
+        if dim in 'xy':
+            pixel_size_scale1 *= scale
+        translations.append(translation1)
+
+    return scales, translations
+
+
+if __name__ == "__main__":
+    from playground.zarr_python.src.zip_zarr import zip_zarr_read
+
+    #filename = 'C:/Project/slides/6001240.zarr'
+    #filename = 'C:/Project/slides/ozx/6001240.ozx'
+    #filename = 'C:/Project/slides/ozx/kingsnake.ozx'
+    #result = zip_zarr_read(filename)
+    #print(result)
+
+    filename = 'C:/Project/slides/ozx/test.ozx'
+    data = np.random.rand(100, 100)
+    dim_order = 'yx'
+    pixel_size = {'x': 1, 'y': 1}
+    zip_zarr_write(filename, data, dim_order, pixel_size)
+
+    result = zip_zarr_read(filename)
+    print(result)
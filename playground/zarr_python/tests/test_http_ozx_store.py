@@ -0,0 +1,115 @@
+import functools
+import os
+import re
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+import zarr
+
+from playground.zarr_python.src.http_ozx_store import HttpOzxStore, HttpRangeReader
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_index import get_zip_index
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    # Static file server with (single) byte range support, and keep-alive connections
+    protocol_version = 'HTTP/1.1'
+    connections = []
+
+    def setup(self):
+        super().setup()
+        self.connections.append(self.client_address)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if not os.path.isfile(path) or match is None:
+            self.send_error(404 if not os.path.isfile(path) else 400)
+            return
+        size = os.path.getsize(path)
+        status = 206
+        if self.path.endswith('.full'):
+            # a server without range support returns the whole file
+            start, end, status = 0, size - 1, 200
+        elif match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        with open(path, 'rb') as file:
+            file.seek(start)
+            data = file.read(end - start + 1)
+        self.send_response(status)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server(tmp_path):
+    RangeRequestHandler.connections = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(RangeRequestHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_store(tmp_path, server):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(2, 512, 512)
+    zip_zarr_write_streaming(uri, data, 'cyx', {}, chunks=(1, 64, 64), shards=(1, 256, 256), nlevels=3)
+    url = f'{server}/test.ozx'
+
+    store = HttpOzxStore(url, block_size=64 * 1024)
+    root = zarr.open(store, mode='r')
+    local_index = get_zip_index(uri)
+    assert store.index.names == local_index.names
+    assert list(store.index.header_offsets) == list(local_index.header_offsets)
+    assert store.index.comment == local_index.comment
+    # tail and central directory
+    assert store._reader.nrequests <= 2
+
+    assert np.array_equal(root['0'][:, 100:300, 50:120], data[:, 100:300, 50:120])
+    nrequests = store._reader.nrequests
+    # repeated reads are served from the block cache
+    assert np.array_equal(root['0'][:, 100:300, 50:120], data[:, 100:300, 50:120])
+    assert store._reader.nrequests == nrequests
+    local_store = OzxStore(uri)
+    for key in ['zarr.json', '1/c/0/0/0']:
+        assert store.get_entry_view(key) == local_store.get_entry_view(key)
+    # keep-alive connections (one per calling thread) are reused for all requests
+    assert len(RangeRequestHandler.connections) == len(store._reader.connections) <= 2
+    assert store._reader.nrequests > 2 * len(RangeRequestHandler.connections)
+    store.close()
+
+    metadata, arrays = zip_zarr_read(url)
+    assert isinstance(arrays[0].store, HttpOzxStore)
+    assert metadata['version'] == '0.5'
+    assert np.array_equal(arrays[0][:], data)
+
+
+def test_http_range_error(tmp_path, server):
+    for name in ['test.bin', 'test.full']:
+        with open(os.path.join(tmp_path, name), 'wb') as file:
+            file.write(bytes(range(256)))
+    reader = HttpRangeReader(f'{server}/missing.bin')
+    with pytest.raises(OSError, match='HTTP 404'):
+        reader.fetch_tail()
+    reader.target = '/test.full'
+    with pytest.raises(OSError, match='HTTP 200'):
+        reader.fetch_tail()
+    # the full body is not read: the connection is dropped, and the next request reconnects
+    assert reader.local.connection.sock is None
+    reader.target = '/test.bin'
+    assert reader.read(16, 4) == bytes(range(16, 20))
+    assert reader.nrequests == 3
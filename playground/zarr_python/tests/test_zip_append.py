@@ -0,0 +1,137 @@
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+from playground.zarr_python.src.zip_index import ZipIndex
+from playground.zarr_python.src.zip_pack import compact_zip, recover_zip
+from playground.zarr_python.src.zip_writer import StoredZipWriter
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_append, zip_zarr_write_streaming
+
+
+dim_order = 'tcyx'
+pixel_size = {'x': 1, 'y': 1}
+write_options = {'chunks': (1, 1, 32, 32), 'shards': (2, 1, 64, 64), 'nlevels': 3}
+
+
+def create_data(nt, seed):
+    return np.random.default_rng(seed).integers(0, 60000, (nt, 2, 100, 150), dtype=np.uint16)
+
+
+def check_levels(uri, reference_uri):
+    _, datas = zip_zarr_read(uri)
+    _, reference_datas = zip_zarr_read(reference_uri)
+    assert [data.shape for data in datas] == [data.shape for data in reference_datas]
+    for data, reference_data in zip(datas, reference_datas):
+        assert np.array_equal(data[:], reference_data[:])
+
+
+@pytest.mark.parametrize('consolidated', [False, True])
+def test_append(tmp_path, consolidated):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    # 3 time points: the last shard along t (size 2) is partially filled and rewritten by the first append
+    parts = [create_data(3, 0), create_data(1, 1), create_data(4, 2)]
+    zip_zarr_write_streaming(uri, parts[0], dim_order, pixel_size, consolidated=consolidated, **write_options)
+    plane_nbytes = parts[0][:1].nbytes
+    # time points written per append: from the start of the last shard
+    for part, nwritten in zip(parts[1:], [2, 4]):
+        size = os.path.getsize(uri)
+        zip_zarr_append(uri, part, 't')
+        # (incompressible) data of the written time points in all pyramid levels, and the small metadata
+        assert os.path.getsize(uri) - size < 1.5 * nwritten * plane_nbytes
+
+    reference_uri = os.path.join(tmp_path, 'reference.ozx')
+    zip_zarr_write_streaming(reference_uri, np.concatenate(parts), dim_order, pixel_size, **write_options)
+    check_levels(uri, reference_uri)
+    with zipfile.ZipFile(uri) as zip_file:
+        assert zip_file.testzip() is None
+        assert zip_file.comment == b'{"ome": {"version": "0.5"}}'
+
+    compact_uri = os.path.join(tmp_path, 'compact.ozx')
+    compact_zip(uri, compact_uri)
+    index = ZipIndex.from_file(compact_uri)
+    names = index.names
+    metadata_names = [name for name in names if name.endswith('zarr.json')]
+    assert names[:len(metadata_names)] == metadata_names == ['zarr.json', '0/zarr.json', '1/zarr.json', '2/zarr.json']
+    # entries in archive order, without unreferenced data
+    assert list(index.header_offsets) == sorted(index.header_offsets)
+    assert os.path.getsize(compact_uri) < os.path.getsize(uri)
+    check_levels(compact_uri, reference_uri)
+
+    compact_zip(uri)
+    check_levels(uri, reference_uri)
+
+
+def test_compact_error(tmp_path, monkeypatch):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    zip_zarr_write_streaming(uri, create_data(2, 0), dim_order, pixel_size, **write_options)
+    size = os.path.getsize(uri)
+
+    def failing_write_file(*args, **kwargs):
+        raise OSError('write failed')
+
+    monkeypatch.setattr(StoredZipWriter, 'write_file', failing_write_file)
+    compact_uri = os.path.join(tmp_path, 'compact.ozx')
+    for target in [compact_uri, None]:
+        with pytest.raises(OSError):
+            compact_zip(uri, target, max_buffer_size=0)
+    # no partial archive is left behind, and the source is unchanged
+    assert sorted(os.listdir(tmp_path)) == ['test.ozx']
+    assert os.path.getsize(uri) == size
+
+
+def test_append_channels(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = create_data(2, 0)
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, **write_options)
+    zip_zarr_append(uri, data[:, :1] + 1, 'c')
+    _, datas = zip_zarr_read(uri)
+    assert np.array_equal(datas[0][:], np.concatenate([data, data[:, :1] + 1], axis=1))
+
+
+def test_append_invalid(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = create_data(2, 0)
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, **write_options)
+    with pytest.raises(ValueError):
+        zip_zarr_append(uri, data, 'x')
+    with pytest.raises(ValueError):
+        zip_zarr_append(uri, data[..., :50], 't')
+    with pytest.raises(ValueError):
+        zip_zarr_append(uri, data.astype(np.float32), 't')
+
+    with pytest.raises(ValueError):
+        zip_zarr_append(uri, data, 't', multiscale=1)
+
+    # a failed append leaves the original archive
+    size = os.path.getsize(uri)
+    with pytest.raises(RuntimeError):
+        with StoredZipWriter(uri, mode='a') as writer:
+            writer.write('0/zarr.json', b'{}')
+            raise RuntimeError
+    assert os.path.getsize(uri) == size
+    _, datas = zip_zarr_read(uri)
+    assert np.array_equal(datas[0][:], data)
+
+
+def test_append_interrupted(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = create_data(2, 0)
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, **write_options)
+    size = os.path.getsize(uri)
+    assert recover_zip(uri) is None
+    # a process killed while appending: new data (beyond the end record search range), no new central directory
+    writer = StoredZipWriter(uri, mode='a')
+    writer.write('0/c/2/0/0/0', np.random.default_rng(0).bytes(200000))
+    writer.file.close()
+    with pytest.raises(zipfile.BadZipFile):
+        ZipIndex.from_file(uri)
+    # the original central directory is intact
+    assert recover_zip(uri, block_size=4096) == size
+    _, datas = zip_zarr_read(uri)
+    assert np.array_equal(datas[0][:], data)
+    zip_zarr_append(uri, data, 't')
+    _, datas = zip_zarr_read(uri)
+    assert np.array_equal(datas[0][:], np.concatenate([data, data]))
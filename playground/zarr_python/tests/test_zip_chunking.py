@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import zarr
+
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_chunking import get_chunk_shape, get_level_chunks, get_shard_shape
+from playground.zarr_python.src.zip_index import get_zip_index
+from playground.zarr_python.src.zip_pyramid import get_pyramid_shapes
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write, zip_zarr_write_streaming
+
+
+def test_chunk_shapes():
+    shape = (3, 20000, 30000)
+    assert get_chunk_shape(shape, np.uint8, 'cyx') == (1, 1024, 1024)
+    assert get_chunk_shape(shape, np.uint16, 'cyx') == (1, 512, 512)
+    assert get_chunk_shape(shape, np.float64, 'cyx') == (1, 256, 256)
+    assert get_chunk_shape((100, 50), np.uint8, 'yx') == (100, 50)
+
+    chunks = get_chunk_shape(shape, np.uint16, 'cyx')
+    shards = get_shard_shape(shape, np.uint16, 'cyx', chunks, target_shard_bytes=64 * 1024 * 1024)
+    assert shards == (2, 4096, 4096)
+    # small planes: shards extend along the other dimensions up to the target size
+    shards = get_shard_shape((50, 3, 300, 300), np.uint16, 'zcyx', (1, 1, 256, 256), 64 * 1024 * 1024)
+    assert shards == (42, 3, 512, 512)
+    assert all(shard % chunk == 0 for shard, chunk in zip(shards, (1, 1, 256, 256)))
+
+
+def test_level_chunks():
+    level_shapes = get_pyramid_shapes((2, 3000, 1000), 'cyx', 5)
+    level_chunks = get_level_chunks(level_shapes, (1, 512, 512), (2, 2048, 2048))
+    assert level_chunks[0] == ((1, 512, 512), (2, 2048, 1024))
+    assert level_chunks[4] == ((1, 188, 63), (2, 188, 63))
+    for level_shape, (chunks, shards) in zip(level_shapes, level_chunks):
+        assert all(shard % chunk == 0 for shard, chunk in zip(shards, chunks))
+        assert all(chunk <= size for chunk, size in zip(chunks, level_shape))
+
+
+def test_auto_chunked_write(tmp_path):
+    uri = os.path.join(tmp_path, 'auto.ozx')
+    data = (np.random.rand(2, 700, 900) * 255).astype(np.uint8)
+    zip_zarr_write_streaming(uri, data, 'cyx', {'x': 1, 'y': 1}, nlevels=4, target_chunk_bytes=64 * 1024,
+                             target_shard_bytes=512 * 1024)
+    root = zarr.open(OzxStore(uri), mode='r')
+    assert root['0'].chunks == (1, 256, 256) and root['0'].shards == (2, 512, 512)
+    assert root['3'].chunks == (1, 88, 113)
+    assert np.array_equal(root['0'][:], data)
+    # 2 x 2 shards at level 0, single shards at the other levels, plus metadata
+    assert len(get_zip_index(uri)) == 5 + 4 + 3
+
+    uri = os.path.join(tmp_path, 'default.ozx')
+    zip_zarr_write(uri, data[0], 'yx', {'x': 1, 'y': 1})
+    root = zarr.open(OzxStore(uri), mode='r')
+    assert root['0'].chunks == (700, 900) and root['0'].shards == (700, 900)
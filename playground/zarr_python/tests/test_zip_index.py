@@ -0,0 +1,293 @@
+import asyncio
+import mmap
+import os
+import pathlib
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import zarr
+from zarr.abc.store import RangeByteRequest
+from zarr.core.buffer import default_buffer_prototype
+from zarr.core.sync import sync
+from zarr.storage import ZipStore
+
+from playground.zarr_python.src.ozx_store import AsyncOzxStore, OzxStore, coalesce_ranges
+from playground.zarr_python.src.zip_index import (ZipIndex, clear_zip_index_cache, get_index_stamp, get_zip_index,
+                                                  read_end_record, read_metadata_entries, SIDECAR_EXTENSION)
+from playground.zarr_python.src.zip_writer import StoredZipWriter
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def create_zip(filename, compression=zipfile.ZIP_STORED, force_zip64=False):
+    entries = {f'{index}/data': os.urandom(index * 100) for index in range(20)}
+    with zipfile.ZipFile(filename, 'w', compression=compression) as zip:
+        zip.comment = b'{"ome": {"version": "0.5"}}'
+        for name, value in entries.items():
+            with zip.open(name, 'w', force_zip64=force_zip64) as file:
+                file.write(value)
+    return entries
+
+
+def check_index(filename, index):
+    with zipfile.ZipFile(filename) as zip:
+        infos = zip.infolist()
+        assert index.names == [info.filename for info in infos]
+        assert list(index.header_offsets) == [info.header_offset for info in infos]
+        assert list(index.sizes) == [info.file_size for info in infos]
+        assert list(index.compressed_sizes) == [info.compress_size for info in infos]
+        assert list(index.crcs) == [info.CRC for info in infos]
+        assert index.comment == zip.comment
+
+
+def test_index_matches_zipfile(tmp_path):
+    for force_zip64 in [False, True]:
+        filename = os.path.join(tmp_path, f'test{force_zip64}.zip')
+        create_zip(filename, force_zip64=force_zip64)
+        check_index(filename, ZipIndex.from_file(filename))
+
+
+def test_index_sidecar(tmp_path):
+    filename = os.path.join(tmp_path, 'test.zip')
+    create_zip(filename)
+    index = get_zip_index(filename, sidecar=True)
+    assert os.path.exists(filename + SIDECAR_EXTENSION)
+    assert get_zip_index(filename, sidecar=True) is index
+    loaded = ZipIndex.load(filename + SIDECAR_EXTENSION, get_index_stamp(filename))
+    check_index(filename, loaded)
+    assert ZipIndex.load(filename + SIDECAR_EXTENSION, (0, 0)) is None
+
+
+def test_index_rewritten_in_place(tmp_path):
+    # a file rewritten with the same size and mtime (coarse mtime file systems) is not served from the caches
+    filename = os.path.join(tmp_path, 'test.zip')
+    with StoredZipWriter(filename) as writer:
+        writer.write('a', b'1234')
+    stat = os.stat(filename)
+    index = get_zip_index(filename, sidecar=True)
+    with StoredZipWriter(filename) as writer:
+        writer.write('b', b'5678')
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(filename).st_size == stat.st_size
+    index1 = get_zip_index(filename, sidecar=True)
+    assert index.names == ['a'] and index1.names == ['b']
+    clear_zip_index_cache()
+    assert get_zip_index(filename, sidecar=True).names == ['b']
+
+
+def test_store_concurrent_open(tmp_path):
+    filename = os.path.join(tmp_path, 'test.zip')
+    create_zip(filename)
+    index = ZipIndex.from_file(filename)
+    for store_class in [OzxStore, AsyncOzxStore]:
+        store = store_class(filename)
+        assert store == store_class(filename) and len({store, store_class(filename)}) == 1
+        # first reads from several threads open the store once
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            buffers = list(executor.map(lambda name: store.get_sync(name), index.names))
+        assert [len(buffer) for buffer in buffers] == index.sizes.tolist()
+        store.close()
+
+
+def test_store_reads_entries(tmp_path):
+    for compression in [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]:
+        filename = os.path.join(tmp_path, f'test{compression}.zip')
+        entries = create_zip(filename, compression=compression)
+        store = OzxStore(filename)
+        for name, value in entries.items():
+            assert store.get_entry_view(name) == value
+        assert store.get_entry_view('missing') is None
+
+
+def test_store_matches_zipstore(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(2, 130, 70)
+    zip_zarr_write_streaming(uri, data, 'cyx', {'x': 1, 'y': 1}, chunks=(1, 16, 16), shards=(1, 32, 32), nlevels=3)
+    root1 = zarr.open(ZipStore(uri), mode='r')
+    root2 = zarr.open(OzxStore(uri), mode='r')
+    assert root1.metadata.to_dict() == root2.metadata.to_dict()
+    assert sorted(root1.keys()) == sorted(root2.keys())
+    for key in root1.keys():
+        assert np.array_equal(root1[key][:], root2[key][:])
+        assert np.array_equal(root1[key][:, 3:17, 5:40], root2[key][:, 3:17, 5:40])
+
+
+def test_store_zero_copy(tmp_path):
+    filename = os.path.join(tmp_path, 'test.zip')
+    entries = create_zip(filename)
+    store = OzxStore(filename)
+    buffer = sync(store.get('5/data', default_buffer_prototype(), RangeByteRequest(10, 20)))
+    assert buffer.to_bytes() == entries['5/data'][10:20]
+    assert isinstance(store.get_entry_view('5/data').obj, mmap.mmap)
+    store.close()
+    # buffers remain valid after closing the store
+    assert buffer.to_bytes() == entries['5/data'][10:20]
+
+
+def test_store_partial_shard_reads(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(256, 256)
+    zip_zarr_write_streaming(uri, data, 'yx', {}, chunks=(16, 16), shards=(128, 128), nlevels=1)
+    store = OzxStore(uri)
+    reads = []
+    read = store._read
+    store._read = lambda offset, size: reads.append((offset, size)) or read(offset, size)
+    array = zarr.open(store, mode='r')['0']
+    assert np.array_equal(array[10:40, 20:50], data[10:40, 20:50])
+    reads.clear()
+    assert np.array_equal(array[10:40, 20:50], data[10:40, 20:50])
+    # shard index is cached, inner chunks are coalesced into a single read
+    assert len(reads) == 1
+
+
+def test_store_reopen(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    options = {'chunks': (16, 16), 'shards': (128, 128), 'nlevels': 1}
+    data = np.random.rand(256, 256)
+    zip_zarr_write_streaming(uri, data, 'yx', {}, **options)
+    store = OzxStore(uri)
+    assert np.array_equal(zarr.open(store, mode='r')['0'][10:40, 20:50], data[10:40, 20:50])
+    mapping = store._mmap
+    store.close()
+    # no cached shard index views keep the mapping alive
+    assert mapping.closed
+    assert store.index is None
+    data = np.random.rand(256, 256)
+    zip_zarr_write_streaming(uri, data, 'yx', {}, **options)
+    assert np.array_equal(zarr.open(store, mode='r')['0'][10:40, 20:50], data[10:40, 20:50])
+    store.close()
+
+
+def test_coalesce_ranges():
+    ranges = [(0, 100, 200), (1, 0, 50), (2, 60, 90), (3, 1000, 1100)]
+    groups = coalesce_ranges(ranges, max_gap_bytes=10, max_coalesced_bytes=1000)
+    assert [[range1[0] for range1 in group] for group in groups] == [[1, 2, 0], [3]]
+    groups = coalesce_ranges(ranges, max_gap_bytes=10, max_coalesced_bytes=100)
+    assert [[range1[0] for range1 in group] for group in groups] == [[1, 2], [0], [3]]
+
+
+def test_async_store(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(2, 200, 200)
+    zip_zarr_write_streaming(uri, data, 'cyx', {}, chunks=(1, 16, 16), shards=(1, 64, 64), nlevels=2)
+    # path-like uri
+    _, arrays = zip_zarr_read(pathlib.Path(uri), concurrent=True)
+    array = next(array for array in arrays if array.path == '0')
+    assert isinstance(array.store, AsyncOzxStore)
+    assert np.array_equal(array[:, 30:170, 10:150], data[:, 30:170, 10:150])
+
+    store = AsyncOzxStore(uri, max_concurrency=4)
+    keys = [key for key in get_zip_index(uri).names if not key.endswith('zarr.json')]
+
+    async def fetch_all():
+        return await asyncio.gather(*[store.get(key, default_buffer_prototype()) for key in keys])
+
+    buffers = asyncio.run(fetch_all())
+    reference = OzxStore(uri)
+    assert all(buffer.to_bytes() == reference.get_entry_view(key) for key, buffer in zip(keys, buffers))
+
+    # coalesced groups of a shard are fetched at most max_concurrency at a time
+    key = keys[0]
+    byte_ranges = [RangeByteRequest(start, start + 10) for start in range(0, 2000, 100)]
+    get_ranges_sync = store.get_ranges_sync
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def counting_get_ranges_sync(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return get_ranges_sync(*args, **kwargs)
+
+    async def fetch_ranges():
+        return [group async for group in store.get_ranges(key, byte_ranges, prototype=default_buffer_prototype(),
+                                                          max_concurrency=2, max_gap_bytes=0)]
+
+    store.get_ranges_sync = counting_get_ranges_sync
+    groups = asyncio.run(fetch_ranges())
+    assert len(groups) == len(byte_ranges) and active[1] == 2
+    store.close()
+
+
+def test_read_metadata_entries(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    zip_zarr_write_streaming(uri, np.random.rand(64, 64), 'yx', {}, chunks=(16, 16), shards=(32, 32), nlevels=2)
+    index = get_zip_index(uri)
+    documents = read_metadata_entries(uri, index)
+    assert sorted(documents) == ['', '0', '1']
+    assert documents['']['node_type'] == 'group' and 'ome' in documents['']['attributes']
+    assert documents['1']['shape'] == [32, 32]
+
+
+def test_end_record(tmp_path):
+    filename = tmp_path / 'test.zip'
+    create_zip(filename)
+    with open(filename, 'rb') as file, zipfile.ZipFile(filename) as zip:
+        end_record = read_end_record(file)
+        assert end_record.nentries == len(zip.infolist())
+        assert end_record.comment == zip.comment
+        assert not end_record.zip64
+        assert end_record.concat == 0
+
+    filename = tmp_path / 'test64.ozx'
+    with StoredZipWriter(filename) as writer:
+        writer.write('zarr.json', b'{}')
+        writer.write('0/c/0', os.urandom(1000))
+        writer.close(b'{"ome":{"version":"0.5"}}')
+    with open(filename, 'rb') as file:
+        end_record = read_end_record(file)
+    assert end_record.zip64
+    assert end_record.nentries == 2
+    assert end_record.comment == b'{"ome":{"version":"0.5"}}'
+    check_index(filename, ZipIndex.from_file(filename))
+
+
+def test_end_record_comment_and_concat(tmp_path):
+    # a (maximum length) comment containing end record signatures, which zipfile mistakes for the end record
+    filename = tmp_path / 'test.zip'
+    data = os.urandom(1000)
+    comment = b'PK\x05\x06' + os.urandom(100) + b'PK\x05\x06' * 10
+    comment += b'x' * (0xFFFF - len(comment))
+    with StoredZipWriter(filename) as writer:
+        writer.write('zarr.json', b'{}')
+        writer.write('0/c/0', data)
+        writer.close(comment)
+    with open(filename, 'rb') as file:
+        end_record = read_end_record(file)
+    assert end_record.zip64
+    assert end_record.comment == comment
+    index = ZipIndex.from_file(filename)
+    assert index.names == ['zarr.json', '0/c/0']
+    assert OzxStore(filename, index=index).get_sync('0/c/0').to_bytes() == data
+
+    # data prepended to the archive
+    filename = tmp_path / 'test.ozx'
+    with StoredZipWriter(filename) as writer:
+        writer.write('zarr.json', b'{}')
+        writer.write('0/c/0', data)
+        writer.close(b'{"ome":{"version":"0.5"}}')
+    concat_filename = tmp_path / 'concat.zip'
+    concat_filename.write_bytes(os.urandom(12345) + filename.read_bytes())
+    with open(concat_filename, 'rb') as file:
+        end_record = read_end_record(file)
+    assert end_record.concat == 12345
+    index = ZipIndex.from_file(concat_filename)
+    check_index(concat_filename, index)
+    assert OzxStore(concat_filename, index=index).get_sync('0/c/0').to_bytes() == data
+
+
+def test_end_record_invalid(tmp_path):
+    filename = tmp_path / 'test.zip'
+    create_zip(filename)
+    data = filename.read_bytes()
+    for invalid in [b'', b'not a zip file' * 100, data[:-10], data[:len(data) // 2]]:
+        filename.write_bytes(invalid)
+        with open(filename, 'rb') as file, pytest.raises(zipfile.BadZipFile):
+            ZipIndex.from_fileobj(file)
@@ -0,0 +1,35 @@
+import json
+import os
+
+import numpy as np
+
+from playground.zarr_python.src.zip_instrumentation import InstrumentedStore, StoreStats
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def test_instrumented_read(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(2, 256, 256)
+    zip_zarr_write_streaming(uri, data, 'cyx', {}, chunks=(1, 32, 32), shards=(1, 128, 128), nlevels=2)
+    for concurrent in [False, True]:
+        stats = StoreStats()
+        _, arrays = zip_zarr_read(uri, concurrent=concurrent, stats=stats)
+        array = next(array for array in arrays if array.path == '0')
+        assert isinstance(array.store, InstrumentedStore)
+        assert np.array_equal(array[:, 10:100, 50:200], data[:, 10:100, 50:200])
+
+        operations = stats.get_stats()
+        # all zarr.json entries are read in a single metadata load
+        assert operations['metadata_load']['count'] == 1 and operations['metadata_load']['bytes'] > 0
+        assert operations['open']['count'] == 1
+        # shard indexes (suffix reads) and coalesced inner chunk reads
+        assert operations['partial_get']['count'] >= 1
+        assert operations['ranges']['bytes'] > 0
+        for operation in operations.values():
+            assert sum(operation['histogram'].values()) == operation['count']
+        assert json.loads(stats.to_json()) == json.loads(json.dumps(operations))
+
+    stats.dump(os.path.join(tmp_path, 'stats.json'))
+    stats.reset()
+    assert stats.get_stats() == {}
@@ -0,0 +1,71 @@
+import os
+import zipfile
+
+import numpy as np
+import pytest
+import zarr
+
+from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZarrValidator
+from playground.zarr_python.src import zip_pack
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_index import get_zip_index
+from playground.zarr_python.src.zip_pack import pack_zarr
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def create_zarr_directory(tmp_path):
+    uri = os.path.join(tmp_path, 'source.ozx')
+    data = np.random.rand(2, 200, 150)
+    zip_zarr_write_streaming(uri, data, 'cyx', {'x': 1, 'y': 1}, chunks=(1, 16, 16), shards=(1, 64, 64), nlevels=3)
+    directory = os.path.join(tmp_path, 'source.zarr')
+    with zipfile.ZipFile(uri) as zip:
+        zip.extractall(directory)
+    # nested group to check breadth-first metadata order
+    labels = zarr.open_group(os.path.join(directory, 'labels'), mode='w')
+    labels.create_array('cells', shape=(10, 10), dtype='uint8', chunks=(5, 5))[:] = 1
+    return directory, data
+
+
+def test_pack_zarr(tmp_path):
+    directory, data = create_zarr_directory(tmp_path)
+    for max_buffer_size in [8 * 1024 * 1024, 0]:
+        # max_buffer_size=0: all entries copied file to file
+        uri = os.path.join(tmp_path, f'packed{max_buffer_size}.ozx')
+        pack_zarr(directory, uri, max_workers=2, max_buffer_size=max_buffer_size, max_pending=4)
+
+        with zipfile.ZipFile(uri) as zip:
+            assert zip.testzip() is None
+            infos = zip.infolist()
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in infos)
+            for info in infos:
+                with open(os.path.join(directory, info.filename), 'rb') as file:
+                    assert zip.read(info) == file.read()
+        names = [info.filename for info in infos]
+        metadata_names = [name for name in names if name.endswith('zarr.json')]
+        assert names[:len(metadata_names)] == metadata_names
+        assert metadata_names[:5] == ['zarr.json', '0/zarr.json', '1/zarr.json', '2/zarr.json', 'labels/zarr.json']
+        assert get_zip_index(uri).zip64
+
+        validator = ZipZarrValidator(uri, fast=True)
+        for check_name in ['test_recommendation2', 'test_recommendation4', 'test_recommendation5']:
+            getattr(validator, check_name)()
+        root = zarr.open(OzxStore(uri), mode='r')
+        assert np.array_equal(root['0'][:], data)
+        assert np.all(root['labels/cells'][:] == 1)
+
+
+def test_pack_zarr_error(tmp_path, monkeypatch):
+    directory, _ = create_zarr_directory(tmp_path)
+    uri = os.path.join(tmp_path, 'packed.ozx')
+    read_entry = zip_pack.read_entry
+
+    def failing_read_entry(filename, max_buffer_size):
+        if filename.endswith('cells/zarr.json'):
+            raise OSError('read failed')
+        return read_entry(filename, max_buffer_size)
+
+    monkeypatch.setattr(zip_pack, 'read_entry', failing_read_entry)
+    with pytest.raises(OSError):
+        pack_zarr(directory, uri, max_workers=2)
+    # no partial archive is left behind
+    assert not os.path.exists(uri) and not os.path.exists(uri + '.tmp')
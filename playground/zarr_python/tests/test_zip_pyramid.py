@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+import zarr
+
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_pyramid import downsample
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+labels = np.array([[1, 1, 2, 3, 4],
+                   [2, 1, 3, 3, 4],
+                   [5, 6, 7, 7, 9],
+                   [6, 6, 8, 9, 9]], dtype=np.uint8)
+
+
+def test_downsample_methods():
+    assert downsample(labels, 'yx', method='mode').tolist() == [[1, 3, 4], [6, 7, 9]]
+    assert downsample(labels, 'yx', method='nearest').tolist() == [[1, 2, 4], [5, 7, 9]]
+    assert downsample(labels, 'yx', method='mean').tolist() == [[1, 3, 4], [6, 8, 9]]
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.int32, np.float32, np.float64])
+def test_downsample_mean_dtype(dtype):
+    data = (np.random.rand(2, 3, 33, 64) * 100).astype(dtype)
+    result = downsample(data, 'czyx')
+    assert result.dtype == data.dtype
+    assert result.shape == (2, 3, 17, 32)
+    padded = np.pad(data.astype(np.float64), [(0, 0), (0, 0), (0, 1), (0, 0)], mode='edge')
+    expected = padded.reshape(2, 3, 17, 2, 32, 2).mean(axis=(3, 5))
+    if np.issubdtype(dtype, np.integer):
+        expected = np.floor(expected + 0.5)
+    assert np.allclose(result, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('dtype', [np.uint64, np.int64])
+def test_downsample_mean_int64(dtype):
+    info = np.iinfo(dtype)
+    data = np.array([[info.max, info.max - 2], [info.max - 1, info.max - 1]], dtype=dtype)
+    assert downsample(data, 'yx').tolist() == [[info.max - 1]]
+    data = np.full((2, 2), info.min, dtype=dtype)
+    assert downsample(data, 'yx').tolist() == [[info.min]]
+    # exact against python integers, rounding half up
+    data = np.random.default_rng(0).integers(info.min, info.max, (6, 9), dtype=dtype, endpoint=True)
+    blocks = data.reshape(2, 3, 3, 3).swapaxes(1, 2).reshape(2, 3, 9).tolist()
+    expected = [[(sum(block) + 4) // 9 for block in row] for row in blocks]
+    assert downsample(data, 'yx', downscale=3).tolist() == expected
+
+
+def test_downsample_mode_large_block():
+    # counts in blocks of 256 or more pixels
+    data = np.zeros((17, 17), dtype=np.uint8)
+    data.flat[:29] = 7
+    assert downsample(data, 'yx', downscale=17, method='mode').tolist() == [[0]]
+
+
+def test_reused_tile_buffer(tmp_path):
+    # tiles covering whole shards are encoded later by the shard writer: a reused tile buffer must not be overwritten
+    uri = os.path.join(tmp_path, 'tiles.ozx')
+    data = np.random.default_rng(0).integers(0, 60000, (512, 512), dtype=np.uint16)
+    buffer = np.empty((128, 128), dtype=data.dtype)
+
+    def iter_tiles():
+        for y in range(0, 512, 128):
+            for x in range(0, 512, 128):
+                buffer[:] = data[y:y + 128, x:x + 128]
+                yield (y, x), buffer
+
+    zip_zarr_write_streaming(uri, iter_tiles(), 'yx', {}, shape=data.shape, dtype=data.dtype, chunks=(64, 64),
+                             shards=(128, 128), nlevels=2, max_workers=4)
+    root = zarr.open(OzxStore(uri), mode='r')
+    assert np.array_equal(root['0'][:], data)
+    assert np.array_equal(root['1'][:], downsample(data, 'yx'))
+
+
+def test_label_pyramid(tmp_path):
+    uri = os.path.join(tmp_path, 'labels.ozx')
+    data = np.random.randint(0, 5, size=(130, 90), dtype=np.uint32)
+    zip_zarr_write_streaming(uri, data, 'yx', {}, chunks=(16, 16), shards=(32, 32), nlevels=3, method='mode')
+    root = zarr.open(OzxStore(uri), mode='r')
+    expected = data
+    for level in range(3):
+        assert np.array_equal(root[str(level)][:], expected)
+        assert set(np.unique(root[str(level)][:])) <= set(range(5))
+        expected = downsample(expected, 'yx', method='mode')
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+from playground.zarr_python.src.zip_instrumentation import StoreStats
+from playground.zarr_python.src.zip_region_reader import RegionReader, read_regions
+from playground.zarr_python.src.zip_tile_cache import TileCache
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+data = np.random.default_rng(0).integers(0, 60000, (2, 301, 257), dtype=np.uint16)
+
+
+@pytest.fixture(scope='module')
+def uri(tmp_path_factory):
+    uri = os.path.join(tmp_path_factory.mktemp('regions'), 'test.ozx')
+    zip_zarr_write_streaming(uri, data, 'cyx', {'x': 1, 'y': 1}, chunks=(1, 32, 32), shards=(1, 128, 128), nlevels=3)
+    return uri
+
+
+def test_read_regions(uri):
+    _, arrays = zip_zarr_read(uri)
+    rng = np.random.default_rng(1)
+    requests = []
+    for _ in range(200):
+        level = int(rng.integers(0, 3))
+        shape = arrays[level].shape
+        y, x = rng.integers(0, shape[1]), rng.integers(0, shape[2])
+        requests.append((level, (slice(None), slice(y, y + 40), slice(x, x + 40))))
+    requests += [(0, (1, slice(100, 200), 5)), (1, Ellipsis), (2, (slice(0, 1), slice(10, 10)))]
+    with RegionReader(arrays, max_workers=4) as reader:
+        results = reader.read(requests)
+    for (level, selection), result in zip(requests, results):
+        expected = arrays[level][selection]
+        assert result.shape == expected.shape
+        assert np.array_equal(result, expected)
+
+    # preallocated outputs
+    out = [np.zeros((2, 16, 16), dtype=data.dtype) for _ in range(3)]
+    selections = [(slice(None), slice(y, y + 16), slice(x, x + 16)) for y, x in [(0, 0), (120, 120), (285, 241)]]
+    assert read_regions(arrays, [(0, selection) for selection in selections], out=out) == out
+    for output, selection in zip(out, selections):
+        assert np.array_equal(output, data[selection])
+    with pytest.raises(ValueError):
+        read_regions(arrays, [(0, (slice(None), slice(0, 8), slice(0, 8)))], out=out[:1])
+
+
+def test_read_regions_deduplicates(uri):
+    # overlapping requests within one shard: each shard is read once
+    stats = StoreStats()
+    _, arrays = zip_zarr_read(uri, stats=stats)
+    requests = [(0, (0, slice(y, y + 20), slice(10, 30))) for y in range(0, 100, 10)]
+    results = read_regions(arrays, requests)
+    assert all(np.array_equal(result, data[selection]) for result, (_, selection) in zip(results, requests))
+    operations = stats.get_stats()
+    assert operations['ranges']['count'] == 1
+
+
+def test_read_regions_cached(uri):
+    # arrays read with a tile cache
+    _, arrays = zip_zarr_read(uri, cache=TileCache())
+    assert arrays[0].shards == (1, 128, 128)
+    requests = [(0, (slice(None), slice(100, 200), slice(50, 250))), (1, (1, slice(10, 90), slice(0, 40)))]
+    results = read_regions(arrays, requests)
+    assert np.array_equal(results[0], data[:, 100:200, 50:250])
+    assert np.array_equal(results[1], arrays[1][1, 10:90, 0:40])
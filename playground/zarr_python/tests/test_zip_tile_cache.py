@@ -0,0 +1,57 @@
+import os
+import threading
+
+import numpy as np
+
+from playground.zarr_python.src.zip_tile_cache import TileCache
+from playground.zarr_python.src.zip_zarr import zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def test_cached_reads(tmp_path):
+    uri = os.path.join(tmp_path, 'test.ozx')
+    data = np.random.rand(3, 200, 120)
+    zip_zarr_write_streaming(uri, data, 'cyx', {}, chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=2)
+    cache = TileCache()
+    _, arrays = zip_zarr_read(uri, cache=cache)
+    array = next(array for array in arrays if array.array.path == '0')
+    assert np.array_equal(array[1, 10:100, 5:70], data[1, 10:100, 5:70])
+    assert np.array_equal(array[..., -1], data[..., -1])
+    stats = cache.get_stats()['levels']['0']
+    assert stats['hits'] == 0 and stats['misses'] > 0
+    misses = stats['misses']
+    assert np.array_equal(array[1, 10:100, 5:70], data[1, 10:100, 5:70])
+    stats = cache.get_stats()['levels']['0']
+    assert stats['misses'] == misses and stats['hits'] > 0
+
+
+def test_cache_budget():
+    cache = TileCache(max_bytes=3 * 800)
+    for index in range(5):
+        cache.put(index, np.zeros(100), level=index % 2)
+    stats = cache.get_stats()
+    assert stats['ntiles'] == 3 and stats['nbytes'] == 3 * 800
+    assert cache.get(0, level=0) is None and cache.get(4, level=0) is not None
+    assert stats['levels'][0]['evictions'] + stats['levels'][1]['evictions'] == 2
+
+    tile = np.zeros(100)
+    cache.put('tile', tile)
+    tile[0] = 1
+    assert not cache.get('tile').flags.writeable
+
+
+def test_cache_threads():
+    cache = TileCache(max_bytes=50 * 800)
+
+    def worker(offset):
+        for index in range(200):
+            key = (index + offset) % 80
+            if cache.get(key) is None:
+                cache.put(key, np.full(100, key, dtype=np.float64))
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.nbytes == sum(tile.nbytes for tile, _ in cache.tiles.values()) <= cache.max_bytes
@@ -0,0 +1,103 @@
+import os
+import zipfile
+
+import numpy as np
+import zarr
+
+from playground.validation.zip_zarr_validator.src.ZipZarrValidator import ZipZarrValidator
+from playground.zarr_python.src.ozx_store import OzxStore
+from playground.zarr_python.src.zip_index import get_zip_index, read_metadata_documents, read_metadata_entries
+from playground.zarr_python.src.zip_instrumentation import StoreStats
+from playground.zarr_python.src.zip_pack import pack_zarr
+from playground.zarr_python.src.zip_zarr import get_zarr_data, iter_zarr_data, zip_zarr_read
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+def create_labeled_image(tmp_path):
+    uri = os.path.join(tmp_path, 'image.ozx')
+    data = np.random.rand(64, 64)
+    zip_zarr_write_streaming(uri, data, 'yx', {}, chunks=(16, 16), shards=(32, 32), nlevels=3)
+    directory = os.path.join(tmp_path, 'image.zarr')
+    with zipfile.ZipFile(uri) as zip:
+        zip.extractall(directory)
+    root = zarr.open_group(directory, mode='r+')
+    root.create_group('labels', attributes={'ome': {'version': '0.5', 'labels': ['cells']}})
+    multiscales = [{'datasets': [{'path': '0'}, {'path': '1'}]}]
+    cells = root.create_group('labels/cells', attributes={'ome': {'version': '0.5', 'multiscales': multiscales}})
+    cells.create_array('0', shape=(64, 64), dtype='uint8', chunks=(32, 32))[:] = 1
+    cells.create_array('1', shape=(32, 32), dtype='uint8', chunks=(32, 32))[:] = 2
+    packed_uri = os.path.join(tmp_path, 'labeled.ozx')
+    pack_zarr(directory, packed_uri)
+    return packed_uri, directory, data
+
+
+def test_traversal_filters(tmp_path):
+    uri, directory, data = create_labeled_image(tmp_path)
+    root = zarr.open(OzxStore(uri), mode='r')
+    assert [array.path for array in iter_zarr_data(root)] == ['0', '1', '2', 'labels/cells/0', 'labels/cells/1']
+    assert [array.path for array in get_zarr_data(root, levels=[0])] == ['0', 'labels/cells/0']
+    assert [array.path for array in get_zarr_data(root, labels=True)] == ['labels/cells/0', 'labels/cells/1']
+    assert [array.path for array in get_zarr_data(root, labels=False, levels=[1, 2])] == ['1', '2']
+    assert [array.path for array in get_zarr_data(root, path_filter=lambda path: path.endswith('1'))] == \
+        ['1', 'labels/cells/1']
+    assert [array.path for array in get_zarr_data(root['labels'])] == ['labels/cells/0', 'labels/cells/1']
+
+    arrays = {array.path: array for array in get_zarr_data(root)}
+    assert np.array_equal(arrays['0'][:], data)
+    assert np.all(arrays['labels/cells/1'][:] == 2)
+
+    # generic traversal for other stores gives the same result
+    directory_root = zarr.open_group(directory, mode='r')
+    assert [array.path for array in get_zarr_data(directory_root)] == list(arrays)
+    assert [array.path for array in get_zarr_data(directory_root, levels=[0], labels=True)] == ['labels/cells/0']
+
+
+def test_traversal_single_metadata_read(tmp_path):
+    uri, _, _ = create_labeled_image(tmp_path)
+    stats = StoreStats()
+    _, arrays = zip_zarr_read(uri, stats=stats, levels=[0])
+    assert [array.path for array in arrays] == ['0', 'labels/cells/0']
+    operations = stats.get_stats()
+    # the hierarchy is opened from one metadata load, without reading zarr.json entries per node
+    assert 'metadata' not in operations
+    assert operations['metadata_load']['count'] == 1
+
+
+def test_consolidated_metadata(tmp_path):
+    uri = os.path.join(tmp_path, 'consolidated.ozx')
+    data = np.random.rand(2, 64, 64)
+    zip_zarr_write_streaming(uri, data, 'cyx', {}, chunks=(1, 16, 16), shards=(1, 32, 32), nlevels=3,
+                             consolidated=True)
+    index = get_zip_index(uri)
+    # per node zarr.json entries are still written (RFC-9)
+    assert index.names[:4] == ['zarr.json', '0/zarr.json', '1/zarr.json', '2/zarr.json']
+    documents, entries = read_metadata_documents(uri, index), read_metadata_entries(uri, index)
+    assert 'consolidated_metadata' in entries[''] and 'consolidated_metadata' not in documents['']
+    assert documents['']['attributes'] == entries['']['attributes']
+    assert {path: document for path, document in documents.items() if path} == \
+        {path: document for path, document in entries.items() if path}
+
+    # zarr.json entries read through the store ('metadata' operations), besides the single metadata load
+    stats = StoreStats()
+    _, arrays = zip_zarr_read(uri, index=index, stats=stats)
+    assert [array.path for array in arrays] == ['0', '1', '2']
+    assert np.array_equal(arrays[0][:], data)
+    assert 'metadata' not in stats.get_stats()
+    assert stats.get_stats()['metadata_load']['count'] == 1
+
+    # fast mode validates the metadata documents: nothing is read through the store
+    stats = StoreStats()
+    validator = ZipZarrValidator(uri, fast=True, stats=stats)
+    validator.test_requirement12()
+    validator.test_recommendation3()
+    assert stats.get_stats() == {}
+
+    # full mode opens the hierarchy: only the root zarr.json (read twice by zarr.open), the arrays come from the
+    # consolidated metadata
+    stats = StoreStats()
+    validator = ZipZarrValidator(uri, fast=False, stats=stats)
+    assert [array.path for array in validator.data] == ['0', '1', '2']
+    assert stats.get_stats()['metadata']['count'] == 2
+    # ome_zarr_models reads the zarr.json of every array (and probes for labels)
+    validator.test_requirement12()
+    assert stats.get_stats()['metadata']['count'] == 2 + 4
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pytest
+import zarr
+from zarr.storage import ZipStore
+from zipfile import ZipFile
+
+from playground.zarr_python.src.zip_index import get_zip_index
+from playground.zarr_python.src.zip_pyramid import downsample
+from playground.zarr_python.src.zip_zarr_writer import zip_zarr_write_streaming
+
+
+dim_order = 'cyx'
+pixel_size = {'x': 1, 'y': 1}
+data = (np.random.rand(2, 301, 157) * 60000).astype(np.uint16)
+
+
+def iter_tiles(tile_size=(100, 60)):
+    for y in range(0, data.shape[1], tile_size[0]):
+        for x in range(0, data.shape[2], tile_size[1]):
+            yield (0, y, x), data[:, y:y + tile_size[0], x:x + tile_size[1]]
+
+
+def check_pyramid(uri, nlevels=4):
+    root = zarr.open(ZipStore(uri), mode='r')
+    expected = data
+    for level in range(nlevels):
+        assert np.array_equal(root[str(level)][:], expected), f'level {level} mismatch'
+        expected = downsample(expected, dim_order)
+
+
+def test_streaming_write_memmap(tmp_path):
+    source = np.lib.format.open_memmap(os.path.join(tmp_path, 'source.npy'), mode='w+',
+                                       dtype=data.dtype, shape=data.shape)
+    source[:] = data
+    uri = os.path.join(tmp_path, 'memmap.ozx')
+    zip_zarr_write_streaming(uri, source, dim_order, pixel_size, chunks=(1, 32, 32), shards=(1, 64, 64),
+                             nlevels=4, max_pending_shards=4)
+    check_pyramid(uri)
+
+
+def test_streaming_write_tiles(tmp_path):
+    uri = os.path.join(tmp_path, 'tiles.ozx')
+    zip_zarr_write_streaming(uri, iter_tiles(), dim_order, pixel_size, shape=data.shape, dtype=data.dtype,
+                             chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4, max_pending_shards=64)
+    check_pyramid(uri)
+
+
+def test_streaming_write_pending_limit(tmp_path):
+    uri = os.path.join(tmp_path, 'limit.ozx')
+    with pytest.raises(ValueError):
+        zip_zarr_write_streaming(uri, iter_tiles(), dim_order, pixel_size, shape=data.shape, dtype=data.dtype,
+                                 chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4, max_pending_shards=2)
+    # no partial archive is left behind
+    assert os.listdir(tmp_path) == []
+
+
+def test_streaming_write_incomplete(tmp_path):
+    uri = os.path.join(tmp_path, 'incomplete.ozx')
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4)
+    size = os.path.getsize(uri)
+    tiles = list(iter_tiles())[:-1]
+    with pytest.raises(ValueError):
+        zip_zarr_write_streaming(uri, tiles, dim_order, pixel_size, shape=data.shape, dtype=data.dtype,
+                                 chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4, max_pending_shards=64)
+    # an existing archive is left unchanged
+    assert os.listdir(tmp_path) == ['incomplete.ozx']
+    assert os.path.getsize(uri) == size
+    check_pyramid(uri)
+
+
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_parallel_write_entry_order(tmp_path, use_processes):
+    uri = os.path.join(tmp_path, 'parallel.ozx')
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4,
+                             max_workers=4, use_processes=use_processes)
+    check_pyramid(uri)
+    filenames = ZipFile(uri).namelist()
+    nmetadata = sum(1 for filename in filenames if filename.endswith('zarr.json'))
+    assert filenames[0] == 'zarr.json'
+    assert all(filename.endswith('zarr.json') for filename in filenames[:nmetadata])
+    assert len(filenames) == len(set(filenames))
+
+
+def test_single_pass_archive(tmp_path):
+    uri = os.path.join(tmp_path, 'single.ozx')
+    zip_zarr_write_streaming(uri, data, dim_order, pixel_size, chunks=(1, 32, 32), shards=(1, 64, 64), nlevels=4)
+    with ZipFile(uri) as zip:
+        assert zip.testzip() is None
+        assert zip.comment == b'{"ome": {"version": "0.5"}}'
+        infos = zip.infolist()
+    # written once: entries are contiguous, without dead (overwritten) entries in between
+    index = get_zip_index(uri)
+    with open(uri, 'rb') as file:
+        def read(offset, size):
+            file.seek(offset)
+            return file.read(size)
+
+        end = 0
+        for entry_index, info in enumerate(infos):
+            assert info.header_offset == end
+            end = index.get_data_offset(entry_index, read) + info.compress_size
+    assert [info.filename for info in infos][:5] == ['zarr.json', '0/zarr.json', '1/zarr.json', '2/zarr.json',
+                                                     '3/zarr.json']
+
+
+def test_writer_names_from_read_module():
+    # names moved to zip_zarr_writer remain importable from zip_zarr
+    from playground.zarr_python.src import zip_zarr, zip_zarr_writer
+    from playground.zarr_python.src.zip_zarr import create_axes_metadata, zip_zarr_write
+
+    assert zip_zarr_write is zip_zarr_writer.zip_zarr_write
+    assert create_axes_metadata is zip_zarr_writer.create_axes_metadata
+    with pytest.raises(AttributeError):
+        zip_zarr.missing_name